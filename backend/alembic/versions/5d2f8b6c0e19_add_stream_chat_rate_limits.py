@@ -0,0 +1,30 @@
+"""Add per-stream chat rate limits
+
+Revision ID: 5d2f8b6c0e19
+Revises: a3c9e1f47b20
+Create Date: 2026-10-18 10:04:17.274951
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2f8b6c0e19'
+down_revision: Union[str, Sequence[str], None] = 'a3c9e1f47b20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('streams', sa.Column('chat_user_rate', sa.Float(), nullable=True))
+    op.add_column('streams', sa.Column('chat_stream_rate', sa.Float(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('streams', 'chat_stream_rate')
+    op.drop_column('streams', 'chat_user_rate')
@@ -0,0 +1,48 @@
+"""Make (stream_id, file_path) unique on vods
+
+Revision ID: 8e4b1d6a2f73
+Revises: c71e04d9a5b3
+Create Date: 2026-10-18 14:02:51.306118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e4b1d6a2f73'
+down_revision: Union[str, Sequence[str], None] = 'c71e04d9a5b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+DUPLICATES_QUERY = (
+    "SELECT stream_id, file_path, array_agg(id ORDER BY id) AS ids FROM vods "
+    "GROUP BY stream_id, file_path HAVING count(*) > 1 ORDER BY stream_id, file_path"
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Queued recording-complete events may be delivered more than once; the
+    # unique index lets them insert with ON CONFLICT DO NOTHING. It also
+    # covers the per-stream lookups ix_vods_stream_id served.
+    # Duplicates are refused rather than deleted: which row to keep (and what
+    # refers to the others) is for an operator to decide.
+    duplicates = op.get_bind().execute(sa.text(DUPLICATES_QUERY)).fetchall()
+    if duplicates:
+        listed = "\n".join(f"  stream_id={row.stream_id} file_path={row.file_path!r} ids={list(row.ids)}"
+                           for row in duplicates[:50])
+        raise RuntimeError(
+            f"{len(duplicates)} (stream_id, file_path) pairs have more than one VOD row; "
+            f"remove the extra rows and upgrade again. They are listed by:\n{DUPLICATES_QUERY}\n{listed}"
+        )
+    op.create_index('uq_vods_stream_id_file_path', 'vods', ['stream_id', 'file_path'], unique=True)
+    op.drop_index('ix_vods_stream_id', table_name='vods')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index('ix_vods_stream_id', 'vods', ['stream_id'], unique=False)
+    op.drop_index('uq_vods_stream_id_file_path', table_name='vods')
@@ -0,0 +1,28 @@
+"""Add chat_messages (stream_id, id) index
+
+Revision ID: a3c9e1f47b20
+Revises: db07863eaaa6
+Create Date: 2026-10-18 09:12:40.518203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c9e1f47b20'
+down_revision: Union[str, Sequence[str], None] = 'db07863eaaa6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_chat_messages_stream_id_id', 'chat_messages', ['stream_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_chat_messages_stream_id_id', table_name='chat_messages')
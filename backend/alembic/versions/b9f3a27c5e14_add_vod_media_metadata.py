@@ -0,0 +1,32 @@
+"""Add VOD media metadata columns
+
+Revision ID: b9f3a27c5e14
+Revises: 8e4b1d6a2f73
+Create Date: 2026-10-18 15:21:37.584201
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b9f3a27c5e14'
+down_revision: Union[str, Sequence[str], None] = '8e4b1d6a2f73'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('vods', sa.Column('size_bytes', sa.BigInteger(), nullable=True))
+    op.add_column('vods', sa.Column('format', sa.String(length=16), nullable=True))
+    op.add_column('vods', sa.Column('bitrate', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('vods', 'bitrate')
+    op.drop_column('vods', 'format')
+    op.drop_column('vods', 'size_bytes')
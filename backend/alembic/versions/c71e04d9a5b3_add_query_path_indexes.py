@@ -0,0 +1,40 @@
+"""Add indexes for stream and VOD list queries
+
+Revision ID: c71e04d9a5b3
+Revises: 5d2f8b6c0e19
+Create Date: 2026-10-18 11:26:03.887412
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c71e04d9a5b3'
+down_revision: Union[str, Sequence[str], None] = '5d2f8b6c0e19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # list_streams: unfiltered, by status/visibility, and by owner, all keyset-ordered on (created_at, id)
+    op.create_index('ix_streams_created_at_id', 'streams', ['created_at', 'id'], unique=False)
+    op.create_index('ix_streams_status_is_public_created_at_id', 'streams', ['status', 'is_public', 'created_at', 'id'], unique=False)
+    op.create_index('ix_streams_owner_id_created_at_id', 'streams', ['owner_id', 'created_at', 'id'], unique=False)
+    # list_vods: unfiltered and by visibility; stream_id serves the owner join and per-stream lookups
+    op.create_index('ix_vods_created_at_id', 'vods', ['created_at', 'id'], unique=False)
+    op.create_index('ix_vods_is_public_created_at_id', 'vods', ['is_public', 'created_at', 'id'], unique=False)
+    op.create_index('ix_vods_stream_id', 'vods', ['stream_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_vods_stream_id', table_name='vods')
+    op.drop_index('ix_vods_is_public_created_at_id', table_name='vods')
+    op.drop_index('ix_vods_created_at_id', table_name='vods')
+    op.drop_index('ix_streams_owner_id_created_at_id', table_name='streams')
+    op.drop_index('ix_streams_status_is_public_created_at_id', table_name='streams')
+    op.drop_index('ix_streams_created_at_id', table_name='streams')
@@ -0,0 +1,31 @@
+"""Order chat history by (stream_id, timestamp, id)
+
+Revision ID: e5a7c2d9b416
+Revises: b9f3a27c5e14
+Create Date: 2026-10-18 16:02:11.305718
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a7c2d9b416'
+down_revision: Union[str, Sequence[str], None] = 'b9f3a27c5e14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Ids come from per-worker blocks, so history pages on the timestamp with the id as tie-breaker
+    op.create_index('ix_chat_messages_stream_id_timestamp_id', 'chat_messages', ['stream_id', 'timestamp', 'id'], unique=False)
+    op.drop_index('ix_chat_messages_stream_id_id', table_name='chat_messages')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index('ix_chat_messages_stream_id_id', 'chat_messages', ['stream_id', 'id'], unique=False)
+    op.drop_index('ix_chat_messages_stream_id_timestamp_id', table_name='chat_messages')
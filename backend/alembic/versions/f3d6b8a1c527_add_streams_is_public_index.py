@@ -0,0 +1,29 @@
+"""Add an index for list_streams filtered by visibility alone
+
+Revision ID: f3d6b8a1c527
+Revises: e5a7c2d9b416
+Create Date: 2026-10-18 17:41:29.518306
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3d6b8a1c527'
+down_revision: Union[str, Sequence[str], None] = 'e5a7c2d9b416'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # ?is_public= without ?status= cannot use the status-led index and fell back to a sequential scan
+    op.create_index('ix_streams_is_public_created_at_id', 'streams', ['is_public', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_streams_is_public_created_at_id', table_name='streams')
@@ -1,8 +1,10 @@
 from fastapi import APIRouter
-from app.api import auth, stream, chat_ws, vod
+from app.api import auth, stream, chat_ws, vod, playback, recordings
 
 router = APIRouter()
 router.include_router(auth.router)
 router.include_router(stream.router)
 router.include_router(chat_ws.router)
 router.include_router(vod.router)
+router.include_router(playback.router)
+router.include_router(recordings.router)
@@ -1,67 +1,84 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Body
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Body, Request
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.schemas.user import UserCreate, UserRead
 from app.models import User, UserRole
-from app.services.auth import hash_password, verify_password, create_access_token, get_current_user, require_role, create_refresh_token, verify_refresh_token, revoke_refresh_token
-from app.db.session import SessionLocal
+from app.services.auth import create_access_token, get_current_user, require_role, create_refresh_token, verify_refresh_token, revoke_refresh_token, revoke_all_refresh_tokens
+from app.dependencies import get_async_db
 from sqlalchemy.exc import IntegrityError
 from app.services import security
 from app.services.security import validate_password_complexity, log_auth_event
+from app.services.passwords import PasswordHasherBusy, password_hasher
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+def hashing_unavailable():
+    return HTTPException(status_code=503, detail="Too many concurrent sign-ins, please retry", headers={"Retry-After": "1"})
 
 @router.post("/register")
-def register(user_in: UserCreate, db: Session = Depends(get_db)):
+async def register(user_in: UserCreate, db: AsyncSession = Depends(get_async_db)):
     try:
         validate_password_complexity(user_in.password)
     except ValueError as e:
         log_auth_event("register_failed", user_in.email, str(e))
         raise HTTPException(status_code=400, detail=str(e))
-    user = db.query(User).filter(User.email == user_in.email).first()
+    user = (await db.execute(select(User.id).where(User.email == user_in.email))).first()
     if user:
         log_auth_event("register_failed", user_in.email, "Email already registered")
         raise HTTPException(status_code=400, detail="Email already registered")
+    try:
+        hashed_password = await password_hasher.hash(user_in.password)
+    except PasswordHasherBusy:
+        raise hashing_unavailable()
     db_user = User(
         email=user_in.email,
-        hashed_password=hash_password(user_in.password),
+        hashed_password=hashed_password,
         role=user_in.role,
         is_active=True,
         is_superuser=user_in.is_superuser
     )
     db.add(db_user)
     try:
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         log_auth_event("register_failed", user_in.email, "Registration failed")
         raise HTTPException(status_code=400, detail="Registration failed")
     log_auth_event("register_success", user_in.email)
     # Issue tokens on registration
     access_token = create_access_token({"sub": db_user.email, "role": db_user.role})
-    refresh_token = create_refresh_token(db_user.email)
+    refresh_token = await create_refresh_token(db_user.email)
     return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
 
 @router.post("/login")
-def login(user_in: UserCreate, db: Session = Depends(get_db)):
-    if security.is_account_locked(user_in.email):
+async def login(user_in: UserCreate, request: Request, db: AsyncSession = Depends(get_async_db)):
+    ip = request.client.host if request.client else "unknown"
+    check = await security.check_login(user_in.email, ip)
+    if check.email_locked:
         log_auth_event("login_lockout", user_in.email, "Account locked")
         raise HTTPException(status_code=403, detail="Account is temporarily locked due to too many failed login attempts. Please try again later.")
-    user = db.query(User).filter(User.email == user_in.email).first()
-    if not user or not verify_password(user_in.password, user.hashed_password):
-        security.increment_failed_attempts(user_in.email)
+    if check.ip_throttled:
+        log_auth_event("login_throttled", user_in.email, f"ip={ip}")
+        raise HTTPException(status_code=429, detail="Too many failed login attempts from this address. Please try again later.")
+    user = (await db.execute(select(User).where(User.email == user_in.email))).scalar()
+    valid, new_hash = False, None
+    if user:
+        try:
+            valid, new_hash = await password_hasher.verify_and_update(user_in.password, user.hashed_password)
+        except PasswordHasherBusy:
+            raise hashing_unavailable()
+    if not valid:
+        await security.record_failed_login(user_in.email, ip)
         log_auth_event("login_failed", user_in.email, "Invalid credentials")
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    security.reset_failed_attempts(user_in.email)
+    if new_hash:
+        # Stored hash used a different BCRYPT_ROUNDS; upgrade it while we have the plaintext
+        await db.execute(update(User).where(User.id == user.id).values(hashed_password=new_hash))
+        await db.commit()
+    if check.failed_attempts:
+        await security.reset_failed_attempts(user_in.email)
     access_token = create_access_token({"sub": user.email, "role": user.role})
-    refresh_token = create_refresh_token(user.email)
+    refresh_token = await create_refresh_token(user.email)
     log_auth_event("login_success", user.email)
     return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
 
@@ -79,6 +96,13 @@ def logout(refresh_token: str = Body(..., embed=True)):
     log_auth_event("logout", email)
     return {"msg": "Logged out"}
 
+@router.post("/logout-all")
+def logout_all(current_user: User = Depends(get_current_user)):
+    # Ends every session's ability to refresh; access tokens already issued run to expiry
+    revoke_all_refresh_tokens(current_user.email)
+    log_auth_event("logout_all", current_user.email)
+    return {"msg": "Logged out of all sessions"}
+
 @router.get("/me", response_model=UserRead)
 def read_users_me(current_user: User = Depends(get_current_user)):
     return current_user
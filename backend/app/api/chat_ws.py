@@ -1,78 +1,279 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
-from sqlalchemy.orm import Session
-from typing import Dict, List
-from app.db.session import SessionLocal
-from app.services.auth import get_current_user
-from app.models import ChatMessage, ChatBan, Stream, User
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Coroutine, Dict, List, Literal, Optional, Set
+from app.services.auth import get_current_user_async
+from app.dependencies import get_async_db
+from app.models import Stream, User
 from app.schemas.chat import ChatMessageRead
+from app.core.config import get_settings
+from app.core.redis import async_redis_client
+from app.core.pubsub import pubsub_hub
+from app.core import metrics
+from app.services.chat import ChatIdsUnavailable, chat_ids, chat_writer, MAX_CONTENT_LENGTH
+from app.services.moderation import moderation_cache, moderation_channel, parse_moderation_update
+from app.services.rate_limit import allow_chat_message, chat_rate_limit
+from app.services.presence import presence_tracker
 from datetime import datetime
-import json
+import asyncio
+import time
+
+settings = get_settings()
 
 router = APIRouter()
 
+CHAT_CHANNEL_PREFIX = "chat:stream:"
+BANNED_CLOSE_CODE = 4003
+STREAM_NOT_FOUND_CLOSE_CODE = 4004
+
+def chat_channel(stream_id: int) -> str:
+    return f"{CHAT_CHANNEL_PREFIX}{stream_id}"
+
+BATCH_MODES = {"auto": None, "on": True, "off": False}
+
+class ChatConnection:
+    """A viewer socket with its own bounded outbound queue and writer task."""
+
+    def __init__(self, websocket: WebSocket, user_id: int, batching: Optional[bool] = None):
+        self.websocket = websocket
+        self.user_id = user_id
+        # None follows the room's mode; True/False were negotiated by the client
+        self.batching = batching
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.CHAT_SEND_QUEUE_SIZE)
+        self.writer: Optional[asyncio.Task] = None
+
+    def wants_batches(self, room_batching: bool) -> bool:
+        return room_batching if self.batching is None else self.batching
+
+class ChatRoom:
+    """Per-stream batching state: the message rate and frames awaiting the next window."""
+
+    def __init__(self):
+        self.batching = False
+        self.pending: List[str] = []
+        self.flusher: Optional[asyncio.Task] = None
+        self.rate = 0.0
+        self._window_start = time.monotonic()
+        self._window_count = 0
+
+    def record_message(self):
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        if elapsed >= 1:
+            self.rate = self._window_count / elapsed
+            self._window_start, self._window_count = now, 0
+        self._window_count += 1
+
 class ConnectionManager:
+    """Tracks local sockets per stream and relays chat through Redis pub/sub.
+
+    The process's one pub/sub connection (pubsub_hub) is subscribed to the
+    chat and moderation channels of each stream this worker has viewers for,
+    so a message published by any worker reaches every viewer exactly once.
+    Broadcasting never awaits a socket: messages go onto per-connection queues
+    drained by writer tasks, and full queues are handled by the configured
+    slow-consumer policy.
+
+    Large or busy rooms switch to batching: messages are coalesced into one
+    JSON array frame every CHAT_BATCH_WINDOW_MS for clients that accept it.
+    """
+
     def __init__(self):
-        self.active_connections: Dict[int, List[WebSocket]] = {}
+        self.active_connections: Dict[int, Dict[WebSocket, ChatConnection]] = {}
+        self.rooms: Dict[int, ChatRoom] = {}
+        self.background: Set[asyncio.Task] = set()
+        metrics.register_gauge("chat.connections", lambda: sum(len(c) for c in self.active_connections.values()))
+        metrics.register_gauge("chat.queue_depth_total", lambda: sum(conn.queue.qsize() for conn in self._connections()))
+        metrics.register_gauge("chat.queue_depth_max", lambda: max((conn.queue.qsize() for conn in self._connections()), default=0))
+
+    def _connections(self):
+        for connections in self.active_connections.values():
+            yield from connections.values()
 
-    async def connect(self, stream_id: int, websocket: WebSocket):
+    async def connect(self, stream_id: int, websocket: WebSocket, user_id: int, batching: Optional[bool] = None):
         await websocket.accept()
-        if stream_id not in self.active_connections:
-            self.active_connections[stream_id] = []
-        self.active_connections[stream_id].append(websocket)
+        subscribe = stream_id not in self.active_connections
+        if subscribe:
+            self.active_connections[stream_id] = {}
+            self.rooms[stream_id] = ChatRoom()
+        connection = ChatConnection(websocket, user_id, batching)
+        connection.writer = asyncio.create_task(self._write(stream_id, connection))
+        self.active_connections[stream_id][websocket] = connection
+        if subscribe:
+            await pubsub_hub.subscribe(chat_channel(stream_id), lambda frame: self.broadcast(stream_id, frame))
+            # Bans pushed while Redis was unreachable were missed, so states are reloaded after a reconnect
+            await pubsub_hub.subscribe(
+                moderation_channel(stream_id), lambda update: self._moderate(stream_id, update),
+                on_reconnect=lambda: moderation_cache.forget_stream(stream_id),
+            )
+        await presence_tracker.connect(stream_id, user_id)
 
     def disconnect(self, stream_id: int, websocket: WebSocket):
-        if stream_id in self.active_connections:
-            self.active_connections[stream_id].remove(websocket)
-            if not self.active_connections[stream_id]:
-                del self.active_connections[stream_id]
+        connections = self.active_connections.get(stream_id)
+        if not connections or websocket not in connections:
+            return
+        connection = connections.pop(websocket)
+        if connection.writer and connection.writer is not asyncio.current_task():
+            connection.writer.cancel()
+        self._spawn(presence_tracker.disconnect(stream_id))
+        if not connections:
+            del self.active_connections[stream_id]
+            pubsub_hub.unsubscribe(chat_channel(stream_id))
+            pubsub_hub.unsubscribe(moderation_channel(stream_id))
+            room = self.rooms.pop(stream_id, None)
+            if room and room.flusher:
+                room.flusher.cancel()
+            moderation_cache.forget_stream(stream_id)
 
-    async def broadcast(self, stream_id: int, message: dict):
-        if stream_id in self.active_connections:
-            for connection in self.active_connections[stream_id]:
-                await connection.send_json(message)
+    def _spawn(self, coro: Coroutine):
+        # Keeps fire-and-forget tasks referenced until they finish
+        task = asyncio.create_task(coro)
+        self.background.add(task)
+        task.add_done_callback(self.background.discard)
 
-manager = ConnectionManager()
+    async def publish(self, stream_id: int, frame: str):
+        await async_redis_client.publish(chat_channel(stream_id), frame)
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+    def broadcast(self, stream_id: int, frame: str):
+        # frame is already-encoded JSON, shared by every recipient
+        room = self.rooms.get(stream_id)
+        if room is None:
+            return
+        room.record_message()
+        # The room's mode only changes between windows so no batched client misses a message
+        if not room.pending:
+            room.batching = self._should_batch(stream_id, room)
+        batched = False
+        for connection in list(self.active_connections[stream_id].values()):
+            if connection.wants_batches(room.batching):
+                batched = True
+            else:
+                self._enqueue(stream_id, connection, frame)
+        if batched:
+            room.pending.append(frame)
+            if room.flusher is None:
+                room.flusher = asyncio.create_task(self._flush_batch(stream_id, room))
+
+    def _should_batch(self, stream_id: int, room: ChatRoom) -> bool:
+        return (
+            len(self.active_connections[stream_id]) >= settings.CHAT_BATCH_MIN_VIEWERS
+            or room.rate >= settings.CHAT_BATCH_MIN_RATE
+        )
+
+    async def _flush_batch(self, stream_id: int, room: ChatRoom):
+        await asyncio.sleep(settings.CHAT_BATCH_WINDOW_MS / 1000)
+        frames, room.pending, room.flusher = room.pending, [], None
+        # Items are already-encoded ChatMessageRead objects, so the array is built by joining
+        frame = "[" + ",".join(frames) + "]"
+        for connection in list(self.active_connections.get(stream_id, {}).values()):
+            if connection.wants_batches(room.batching):
+                self._enqueue(stream_id, connection, frame)
+        metrics.incr("chat.batches_sent")
+
+    def _enqueue(self, stream_id: int, connection: ChatConnection, frame: str):
+        try:
+            connection.queue.put_nowait(frame)
+            return
+        except asyncio.QueueFull:
+            pass
+        if settings.CHAT_SLOW_CONSUMER_POLICY == "disconnect":
+            metrics.incr("chat.slow_consumers_evicted")
+            self.disconnect(stream_id, connection.websocket)
+            self._spawn(self._close(connection.websocket, settings.CHAT_SLOW_CONSUMER_CLOSE_CODE))
+            return
+        connection.queue.get_nowait()
+        connection.queue.put_nowait(frame)
+        metrics.incr("chat.messages_dropped")
+
+    async def _write(self, stream_id: int, connection: ChatConnection):
+        try:
+            while True:
+                frame = await connection.queue.get()
+                await connection.websocket.send_text(frame)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            metrics.incr("chat.send_errors")
+            self.disconnect(stream_id, connection.websocket)
+
+    def evict_user(self, stream_id: int, user_id: int, code: int):
+        for connection in list(self.active_connections.get(stream_id, {}).values()):
+            if connection.user_id == user_id:
+                self.disconnect(stream_id, connection.websocket)
+                self._spawn(self._close(connection.websocket, code))
+
+    async def _close(self, websocket: WebSocket, code: int):
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
+
+    def _moderate(self, stream_id: int, update: str):
+        user_id, state = parse_moderation_update(update)
+        moderation_cache.apply(stream_id, user_id, state)
+        if state.is_banned:
+            self.evict_user(stream_id, user_id, BANNED_CLOSE_CODE)
+
+manager = ConnectionManager()
 
 @router.websocket("/ws/streams/{stream_id}/chat")
 async def websocket_chat(
     websocket: WebSocket,
     stream_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    batch: Literal["auto", "on", "off"] = Query("auto"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
-    # Check if user is banned
-    ban = db.query(ChatBan).filter(ChatBan.stream_id == stream_id, ChatBan.user_id == current_user.id).first()
-    if ban and ban.is_banned:
-        await websocket.close(code=4003)
+    result = await db.execute(select(Stream.chat_user_rate, Stream.chat_stream_rate).where(Stream.id == stream_id))
+    stream = result.first()
+    if not stream:
+        await websocket.close(code=STREAM_NOT_FOUND_CLOSE_CODE)
+        return
+    rate_limit = chat_rate_limit(stream.chat_user_rate, stream.chat_stream_rate)
+    # Check if user is banned; the loaded state is kept current by pushed updates
+    state = await moderation_cache.load(db, stream_id, current_user.id)
+    # Hand the pooled connection back; the session outlives the socket otherwise
+    await db.close()
+    if state.is_banned:
+        await websocket.close(code=BANNED_CLOSE_CODE)
         return
-    await manager.connect(stream_id, websocket)
     try:
+        await manager.connect(stream_id, websocket, current_user.id, BATCH_MODES[batch])
         while True:
             data = await websocket.receive_text()
+            # Throttled frames are dropped before any moderation, DB or encoding work
+            if not await allow_chat_message(stream_id, current_user.id, rate_limit):
+                continue
             # Check mute/ban again before accepting message
-            ban = db.query(ChatBan).filter(ChatBan.stream_id == stream_id, ChatBan.user_id == current_user.id).first()
-            if ban and (ban.is_banned or ban.is_muted):
+            state = moderation_cache.get(stream_id, current_user.id)
+            if state is None:
+                state = await moderation_cache.load(db, stream_id, current_user.id)
+                await db.close()
+            if state.is_banned or state.is_muted:
                 continue  # Ignore message
-            # Persist message
-            msg = ChatMessage(
+            if not data or len(data) > MAX_CONTENT_LENGTH:
+                continue
+            try:
+                message_id = await chat_ids.next_id()
+            except ChatIdsUnavailable:
+                # The database is down: this message is dropped, the socket stays open
+                metrics.incr("chat.messages_rejected")
+                continue
+            # Id and timestamp are assigned up front; the row is written behind
+            msg = ChatMessageRead(
+                id=message_id,
                 stream_id=stream_id,
                 user_id=current_user.id,
                 content=data,
                 timestamp=datetime.utcnow(),
                 is_deleted=False
             )
-            db.add(msg)
-            db.commit()
-            db.refresh(msg)
-            # Broadcast to all
-            msg_read = ChatMessageRead.model_validate(msg)
-            await manager.broadcast(stream_id, json.loads(msg_read.model_dump_json()))
+            if not chat_writer.submit(msg.model_dump()):
+                continue
+            # Publish once; every worker's listener fans out to its local viewers
+            await manager.publish(stream_id, msg.model_dump_json())
+            await presence_tracker.chatted(stream_id, current_user.id)
     except WebSocketDisconnect:
+        pass
+    finally:
         manager.disconnect(stream_id, websocket) 
\ No newline at end of file
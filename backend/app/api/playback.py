@@ -0,0 +1,28 @@
+from fastapi import APIRouter, HTTPException, Request, Response
+from urllib.parse import parse_qs, urlsplit
+from app.services.playback import verify_hls_path, verify_signed_path
+
+router = APIRouter(prefix="/playback", tags=["playback"])
+
+@router.get("/verify", status_code=204)
+def verify_playback(request: Request):
+    r"""Target for nginx auth_request; the original URI arrives in X-Original-URI.
+
+    HLS carries its token in the path and nginx strips it before serving, e.g.
+
+        location ~ ^/hls/\d+/[^/]+/(?<file>[^/]+)$ {
+            auth_request /playback/verify;
+            alias /tmp/hls/$file;
+        }
+
+    Recordings carry it in the query string (?expires=&sig=).
+    """
+    uri = urlsplit(request.headers.get("x-original-uri", ""))
+    params = parse_qs(uri.query)
+    if "sig" in params:
+        valid = verify_signed_path(uri.path, params.get("expires", [None])[0], params["sig"][0])
+    else:
+        valid = verify_hls_path(uri.path)
+    if not valid:
+        raise HTTPException(status_code=403, detail="Invalid or expired playback signature")
+    return Response(status_code=204)
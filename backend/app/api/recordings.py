@@ -0,0 +1,28 @@
+from fastapi import APIRouter, HTTPException, Query, Request
+from typing import Optional
+from app.services.playback import verify_signed_path
+from app.services.recordings import (
+    RecordingNotFound, RecordingResponse, RecordingStorageUnavailable, recording_cache, resolve_recording,
+)
+
+router = APIRouter(prefix="/recordings", tags=["vods"])
+
+# Serves the signed URLs from get_vod_playback_url when VOD_BASE_URL points at
+# this backend instead of a separate nginx.
+@router.api_route("/{file_path:path}", methods=["GET", "HEAD"])
+def serve_recording(
+    file_path: str,
+    request: Request,
+    expires: Optional[str] = Query(None),
+    sig: Optional[str] = Query(None)
+):
+    # The signature covers the path exactly as it was issued, i.e. still percent-encoded
+    if not verify_signed_path(request.scope["raw_path"].decode("latin-1"), expires, sig):
+        raise HTTPException(status_code=403, detail="Invalid or expired playback signature")
+    try:
+        recording = recording_cache.open(resolve_recording(file_path))
+    except RecordingNotFound:
+        raise HTTPException(status_code=404, detail="Recording not found")
+    except RecordingStorageUnavailable:
+        raise HTTPException(status_code=503, detail="Recording storage is not configured")
+    return RecordingResponse(recording, request.headers, request.method)
@@ -1,28 +1,41 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query, Body, Request
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy import tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from app.schemas.stream import StreamCreate, StreamUpdate, StreamRead
+from app.schemas.stream import StreamCreate, StreamUpdate, StreamRead, StreamStatusChange
 from app.models import Stream, StreamStatus, User, UserRole, ChatBan, ChatMessage
 from app.db.session import SessionLocal
 from app.services.auth import get_current_user, require_roles
+from app.dependencies import get_db, get_async_db
 import secrets
+from collections import Counter, defaultdict
+from urllib.parse import urlsplit
+import orjson
 from app.core.config import get_settings
+from app.core.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, encode_cursor, page_items, parse_fields
 from app.schemas.chat import ChatBanCreate, ChatBanRead, ChatMessageRead
+from app.services.moderation import publish_moderation_update
+from app.services import response_cache
+from app.services.response_cache import cached_response, stream_namespace
+from app.services.presence import get_presence
+from app.services.playback import forget_stream_path, resolve_stream_keys, signed_hls_url
+from app.services.webhooks import forget_stream_key, read_webhook_payload, resolve_stream_id
+from app.services.webhook_queue import apply_webhook_events, enqueue_webhook
 
 settings = get_settings()
 
 RTMP_BASE_URL = "rtmp://localhost/live"
 HLS_BASE_URL = "http://localhost:8080/hls"
+CHAT_HISTORY_MAX_LIMIT = 5000
+PLAYBACK_BATCH_MAX_IDS = 100
+STREAM_BATCH_MAX_IDS = 100
+STATUS_BATCH_MAX_UPDATES = 500
+CHAT_HISTORY_CHUNK_SIZE = 500
 
 router = APIRouter(prefix="/streams", tags=["streams"])
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.post("/", response_model=StreamRead)
 def create_stream(
     stream_in: StreamCreate,
@@ -40,14 +53,76 @@ def create_stream(
     db.add(stream)
     db.commit()
     db.refresh(stream)
+    response_cache.invalidate("streams")
     return stream
 
+def can_manage(stream, user: User) -> bool:
+    return stream.owner_id == user.id or user.role == UserRole.admin
+
+@router.post("/batch-get")
+def batch_get_streams(
+    ids: List[int] = Body(..., embed=True, min_length=1, max_length=STREAM_BATCH_MAX_IDS),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    ids = list(dict.fromkeys(ids))
+    streams = {stream.id: stream for stream in db.query(Stream).filter(Stream.id.in_(ids)).all()}
+    presence = get_presence(streams)
+    items, not_found, forbidden = [], [], []
+    for stream_id in ids:
+        stream = streams.get(stream_id)
+        if not stream:
+            not_found.append(stream_id)
+        elif not can_manage(stream, current_user):
+            forbidden.append(stream_id)
+        else:
+            stream_read = StreamRead.model_validate(stream)
+            stream_read.viewer_count = presence[stream_id].sockets if stream_id in presence else None
+            items.append(stream_read.model_dump(mode="json"))
+    return {"items": items, "not_found": not_found, "forbidden": forbidden}
+
+@router.post("/batch-status")
+def batch_update_stream_status(
+    updates: List[StreamStatusChange] = Body(..., embed=True, min_length=1, max_length=STATUS_BATCH_MAX_UPDATES),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    # Same checks as update_stream_status, applied per item; everything allowed commits together
+    changes = {change.id: change.status for change in updates}
+    if len(changes) != len(updates):
+        # Two statuses for one stream have no meaningful order; one result per item needs unique ids
+        duplicates = sorted(stream_id for stream_id, count in Counter(change.id for change in updates).items() if count > 1)
+        raise HTTPException(status_code=422, detail=f"Duplicate stream ids: {duplicates}")
+    streams = {row.id: row for row in db.query(Stream.id, Stream.owner_id).filter(Stream.id.in_(changes)).all()}
+    results, allowed = [], defaultdict(list)
+    for stream_id, new_status in changes.items():
+        stream = streams.get(stream_id)
+        if not stream:
+            results.append({"id": stream_id, "status_code": 404, "detail": "Stream not found"})
+        elif not can_manage(stream, current_user):
+            results.append({"id": stream_id, "status_code": 403, "detail": "Not authorized to update stream status"})
+        else:
+            allowed[new_status].append(stream_id)
+            results.append({"id": stream_id, "status_code": 200, "status": new_status})
+    for new_status, stream_ids in allowed.items():
+        db.execute(update(Stream).where(Stream.id.in_(stream_ids)).values(status=new_status))
+    db.commit()
+    if allowed:
+        updated = [stream_id for stream_ids in allowed.values() for stream_id in stream_ids]
+        response_cache.invalidate(*[stream_namespace(stream_id) for stream_id in updated], "streams")
+    return {"results": results}
+
 @router.get("/{stream_id}", response_model=StreamRead)
-def get_stream(stream_id: int, db: Session = Depends(get_db)):
-    stream = db.query(Stream).filter(Stream.id == stream_id).first()
-    if not stream:
-        raise HTTPException(status_code=404, detail="Stream not found")
-    return stream
+def get_stream(stream_id: int, request: Request, db: Session = Depends(get_db)):
+    def build():
+        stream = db.query(Stream).filter(Stream.id == stream_id).first()
+        if not stream:
+            raise HTTPException(status_code=404, detail="Stream not found")
+        stream_read = StreamRead.model_validate(stream)
+        presence = get_presence([stream_id]).get(stream_id)
+        stream_read.viewer_count = presence.sockets if presence else None
+        return Response(stream_read.model_dump_json(), media_type="application/json")
+    return cached_response(request, stream_namespace(stream_id), build)
 
 @router.put("/{stream_id}", response_model=StreamRead)
 def update_stream(
@@ -65,6 +140,7 @@ def update_stream(
         setattr(stream, field, value)
     db.commit()
     db.refresh(stream)
+    response_cache.invalidate(stream_namespace(stream_id), "streams")
     return stream
 
 @router.delete("/{stream_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -80,23 +156,44 @@ def delete_stream(
         raise HTTPException(status_code=403, detail="Not authorized to delete this stream")
     db.delete(stream)
     db.commit()
+    forget_stream_key(stream.stream_key)
+    forget_stream_path(stream_id)
+    response_cache.invalidate(stream_namespace(stream_id), "streams")
     return None
 
 @router.get("/", response_model=List[StreamRead])
 def list_streams(
+    request: Request,
     db: Session = Depends(get_db),
     status: Optional[StreamStatus] = Query(None),
     owner_id: Optional[int] = Query(None),
-    is_public: Optional[bool] = Query(None)
+    is_public: Optional[bool] = Query(None),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = Query(None, description="Comma-separated StreamRead fields to return")
 ):
-    query = db.query(Stream)
+    # Only the requested columns are selected; the next page's cursor goes in X-Next-Cursor
+    selected = parse_fields(fields, StreamRead)
+    columns = [column for column in dict.fromkeys(selected + ["created_at", "id"]) if column in Stream.__table__.columns]
+    query = db.query(*[getattr(Stream, column) for column in columns])
     if status:
         query = query.filter(Stream.status == status)
     if owner_id:
         query = query.filter(Stream.owner_id == owner_id)
     if is_public is not None:
         query = query.filter(Stream.is_public == is_public)
-    return query.order_by(Stream.created_at.desc()).all()
+    if cursor:
+        query = query.filter(tuple_(Stream.created_at, Stream.id) < decode_cursor(cursor))
+    def build():
+        rows = query.order_by(Stream.created_at.desc(), Stream.id.desc()).limit(limit).all()
+        items, next_cursor = page_items(rows, selected, limit)
+        if "viewer_count" in selected:
+            presence = get_presence(row.id for row in rows)
+            for row, item in zip(rows, items):
+                item["viewer_count"] = presence[row.id].sockets if row.id in presence else None
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+        return Response(orjson.dumps(items), media_type="application/json", headers=headers)
+    return cached_response(request, "streams", build)
 
 @router.get("/{stream_id}/ingest-url")
 def get_ingest_url(stream_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
@@ -108,13 +205,54 @@ def get_ingest_url(stream_id: int, db: Session = Depends(get_db), current_user:
     ingest_url = f"{RTMP_BASE_URL}/{stream.stream_key}"
     return {"ingest_url": ingest_url}
 
-@router.get("/{stream_id}/playback-url")
-def get_playback_url(stream_id: int, db: Session = Depends(get_db)):
+@router.post("/{stream_id}/rotate-key")
+def rotate_stream_key(stream_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     stream = db.query(Stream).filter(Stream.id == stream_id).first()
     if not stream:
         raise HTTPException(status_code=404, detail="Stream not found")
-    playback_url = f"{HLS_BASE_URL}/{stream.stream_key}.m3u8"
-    return {"playback_url": playback_url}
+    if stream.owner_id != current_user.id and current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Not authorized to rotate stream key")
+    old_key = stream.stream_key
+    stream.stream_key = secrets.token_urlsafe(24)
+    db.commit()
+    forget_stream_key(old_key)
+    forget_stream_path(stream_id)
+    response_cache.invalidate(stream_namespace(stream_id), "streams")
+    ingest_url = f"{RTMP_BASE_URL}/{stream.stream_key}"
+    return {"ingest_url": ingest_url}
+
+def stream_playback_url(stream_key: str) -> dict:
+    hls = urlsplit(HLS_BASE_URL)
+    return signed_hls_url(f"{hls.scheme}://{hls.netloc}", hls.path, stream_key)
+
+@router.get("/{stream_id}/playback-url")
+def get_playback_url(stream_id: int, db: Session = Depends(get_db)):
+    stream_key = resolve_stream_keys(db, [stream_id]).get(stream_id)
+    if not stream_key:
+        raise HTTPException(status_code=404, detail="Stream not found")
+    return stream_playback_url(stream_key)
+
+@router.post("/playback-urls")
+def get_playback_urls(
+    ids: List[int] = Body(..., embed=True, max_length=PLAYBACK_BATCH_MAX_IDS),
+    db: Session = Depends(get_db)
+):
+    # Unknown ids are simply absent from the result
+    stream_keys = resolve_stream_keys(db, ids)
+    return {str(id): stream_playback_url(key) for id, key in stream_keys.items()}
+
+@router.get("/{stream_id}/stats")
+def get_stream_stats(stream_id: int):
+    # Served from Redis presence only; Postgres is never touched
+    presence = get_presence([stream_id]).get(stream_id)
+    if presence is None:
+        raise HTTPException(status_code=503, detail="Stream stats unavailable")
+    return {
+        "stream_id": stream_id,
+        "viewer_count": presence.sockets,
+        "unique_viewers": presence.unique_viewers,
+        "unique_chatters": presence.unique_chatters,
+    }
 
 @router.post("/{stream_id}/status")
 def update_stream_status(
@@ -126,48 +264,37 @@ def update_stream_status(
     stream = db.query(Stream).filter(Stream.id == stream_id).first()
     if not stream:
         raise HTTPException(status_code=404, detail="Stream not found")
-    if stream.owner_id != current_user.id and current_user.role != UserRole.admin:
+    if not can_manage(stream, current_user):
         raise HTTPException(status_code=403, detail="Not authorized to update stream status")
     stream.status = status
     db.commit()
     db.refresh(stream)
+    response_cache.invalidate(stream_namespace(stream_id), "streams")
     return {"id": stream.id, "status": stream.status}
 
-@router.post("/webhook/stream-start")
-async def webhook_stream_start(request: Request, db: Session = Depends(get_db)):
-    data = None
-    try:
-        data = await request.json()
-    except Exception:
-        data = await request.form()
-    stream_key = data.get("name") or data.get("stream_key")
-    if not stream_key:
-        raise HTTPException(status_code=400, detail="Missing stream_key")
-    stream = db.query(Stream).filter(Stream.stream_key == stream_key).first()
-    if not stream:
-        raise HTTPException(status_code=404, detail="Stream not found")
-    stream.status = StreamStatus.live
-    db.commit()
-    db.refresh(stream)
-    return {"id": stream.id, "status": stream.status}
+@router.post("/webhook/stream-start", status_code=status.HTTP_202_ACCEPTED)
+async def webhook_stream_start(request: Request, db: AsyncSession = Depends(get_async_db)):
+    return await apply_stream_webhook(request, db, StreamStatus.live)
 
-@router.post("/webhook/stream-stop")
-async def webhook_stream_stop(request: Request, db: Session = Depends(get_db)):
-    data = None
-    try:
-        data = await request.json()
-    except Exception:
-        data = await request.form()
+@router.post("/webhook/stream-stop", status_code=status.HTTP_202_ACCEPTED)
+async def webhook_stream_stop(request: Request, db: AsyncSession = Depends(get_async_db)):
+    return await apply_stream_webhook(request, db, StreamStatus.ended)
+
+async def apply_stream_webhook(request: Request, db: AsyncSession, new_status: StreamStatus):
+    data = await read_webhook_payload(request)
     stream_key = data.get("name") or data.get("stream_key")
     if not stream_key:
         raise HTTPException(status_code=400, detail="Missing stream_key")
-    stream = db.query(Stream).filter(Stream.stream_key == stream_key).first()
-    if not stream:
+    # Unknown keys are still refused here, so nginx-rtmp rejects the publish
+    stream_id = await resolve_stream_id(db, stream_key)
+    if stream_id is None:
         raise HTTPException(status_code=404, detail="Stream not found")
-    stream.status = StreamStatus.ended
-    db.commit()
-    db.refresh(stream)
-    return {"id": stream.id, "status": stream.status}
+    event = {"type": "status", "stream_key": stream_key, "stream_id": stream_id, "status": new_status.value}
+    # Applied by the background consumer; only if Redis refuses the append is it written inline
+    queued = await enqueue_webhook(event)
+    if not queued:
+        await apply_webhook_events(db, [(None, event)])
+    return {"id": stream_id, "status": new_status, "queued": queued}
 
 @router.post("/{stream_id}/ban", response_model=ChatBanRead)
 def ban_or_mute_user(
@@ -190,6 +317,7 @@ def ban_or_mute_user(
     ban.is_muted = ban_in.is_muted
     db.commit()
     db.refresh(ban)
+    publish_moderation_update(stream_id, ban.user_id, ban.is_banned, ban.is_muted)
     return ban
 
 @router.post("/{stream_id}/chat/{message_id}/delete", response_model=ChatMessageRead)
@@ -211,4 +339,52 @@ def delete_chat_message(
     message.is_deleted = True
     db.commit()
     db.refresh(message)
-    return ChatMessageRead.model_validate(message) 
\ No newline at end of file
+    return ChatMessageRead.model_validate(message)
+
+@router.get("/{stream_id}/chat")
+def list_chat_messages(
+    stream_id: int,
+    before: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    after: Optional[str] = Query(None, description="Page forward, oldest first, from this cursor"),
+    limit: int = Query(100, ge=1, le=CHAT_HISTORY_MAX_LIMIT),
+    db: Session = Depends(get_db)
+):
+    if not db.query(Stream.id).filter(Stream.id == stream_id).first():
+        raise HTTPException(status_code=404, detail="Stream not found")
+    return StreamingResponse(
+        iter_chat_history(
+            stream_id, decode_cursor(before) if before else None, decode_cursor(after) if after else None, limit
+        ),
+        media_type="application/json"
+    )
+
+def iter_chat_history(stream_id: int, before: Optional[tuple], after: Optional[tuple], limit: int):
+    # Keyset pagination over (stream_id, timestamp, id): newest first by
+    # default, or oldest first when paging forward with after. Ids come from
+    # per-worker blocks and only order messages within a worker; timestamps
+    # order them across workers. Rows are encoded in chunks so large exports
+    # never sit in memory as a whole.
+    db = SessionLocal()
+    try:
+        key = tuple_(ChatMessage.timestamp, ChatMessage.id)
+        query = db.query(ChatMessage).filter(ChatMessage.stream_id == stream_id, ChatMessage.is_deleted.is_(False))
+        if after is not None:
+            query = query.filter(key > after).order_by(ChatMessage.timestamp.asc(), ChatMessage.id.asc())
+        else:
+            if before is not None:
+                query = query.filter(key < before)
+            query = query.order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc())
+        yield '{"items":['
+        count, last, chunk = 0, None, []
+        for message in query.limit(limit).yield_per(CHAT_HISTORY_CHUNK_SIZE):
+            chunk.append(ChatMessageRead.model_validate(message).model_dump_json())
+            count, last = count + 1, message
+            if len(chunk) == CHAT_HISTORY_CHUNK_SIZE:
+                yield ("," if count > len(chunk) else "") + ",".join(chunk)
+                chunk = []
+        if chunk:
+            yield ("," if count > len(chunk) else "") + ",".join(chunk)
+        next_cursor = encode_cursor(last.timestamp, last.id) if count == limit else None
+        yield '],"next_cursor":%s}' % ("null" if next_cursor is None else f'"{next_cursor}"')
+    finally:
+        db.close()
@@ -1,45 +1,74 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query, Body, Request
+from fastapi.responses import Response
+from sqlalchemy import tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from app.db.session import SessionLocal
 from app.models import VOD, User, UserRole, Stream
 from app.schemas.vod import VODRead
 from app.services.auth import get_current_user
-from app.models.vod import VOD
-from app.schemas.vod import VODCreate
-from datetime import datetime
+from app.dependencies import get_db, get_async_db
+from app.services import response_cache
+from app.services.response_cache import cached_response
+from app.services.playback import forget_vod_path, recording_path, resolve_vod_files, signed_url
+from app.services.recordings import RecordingNotFound, RecordingStorageUnavailable, relative_recording_path
+from app.services.webhooks import read_webhook_payload, resolve_stream_id
+from app.services.webhook_queue import apply_webhook_events, enqueue_webhook
+from app.core.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, page_items, parse_fields
+import orjson
+from urllib.parse import urlsplit
 
 router = APIRouter(prefix="/vods", tags=["vods"])
 
 VOD_BASE_URL = "http://localhost:8080/recordings"  # Adjust for prod/cloud
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+PLAYBACK_BATCH_MAX_IDS = 100
 
 @router.get("/", response_model=List[VODRead])
 def list_vods(
+    request: Request,
     db: Session = Depends(get_db),
     is_public: Optional[bool] = Query(None),
-    owner_id: Optional[int] = Query(None)
+    owner_id: Optional[int] = Query(None),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = Query(None, description="Comma-separated VODRead fields to return")
 ):
-    query = db.query(VOD)
+    # Only the requested columns are selected; the next page's cursor goes in X-Next-Cursor
+    selected = parse_fields(fields, VODRead)
+    columns = dict.fromkeys(selected + ["created_at", "id"])
+    query = db.query(*[getattr(VOD, column) for column in columns])
     if is_public is not None:
         query = query.filter(VOD.is_public == is_public)
     if owner_id:
         query = query.join(Stream).filter(Stream.owner_id == owner_id)
-    return query.order_by(VOD.created_at.desc()).all()
+    if cursor:
+        query = query.filter(tuple_(VOD.created_at, VOD.id) < decode_cursor(cursor))
+    def build():
+        rows = query.order_by(VOD.created_at.desc(), VOD.id.desc()).limit(limit).all()
+        items, next_cursor = page_items(rows, selected, limit)
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+        return Response(orjson.dumps(items), media_type="application/json", headers=headers)
+    return cached_response(request, "vods", build)
+
+def vod_playback_url(file_path: str) -> dict:
+    base = urlsplit(VOD_BASE_URL)
+    return signed_url(f"{base.scheme}://{base.netloc}", recording_path(base.path, file_path))
 
 @router.get("/{vod_id}/playback-url")
 def get_vod_playback_url(vod_id: int, db: Session = Depends(get_db)):
-    vod = db.query(VOD).filter(VOD.id == vod_id).first()
-    if not vod:
+    file_path = resolve_vod_files(db, [vod_id]).get(vod_id)
+    if not file_path:
         raise HTTPException(status_code=404, detail="VOD not found")
-    playback_url = f"{VOD_BASE_URL}/{vod.file_path}"
-    return {"playback_url": playback_url}
+    return vod_playback_url(file_path)
+
+@router.post("/playback-urls")
+def get_vod_playback_urls(
+    ids: List[int] = Body(..., embed=True, max_length=PLAYBACK_BATCH_MAX_IDS),
+    db: Session = Depends(get_db)
+):
+    # Unknown ids are simply absent from the result
+    files = resolve_vod_files(db, ids)
+    return {str(id): vod_playback_url(file_path) for id, file_path in files.items()}
 
 @router.delete("/{vod_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_vod(
@@ -55,29 +84,30 @@ def delete_vod(
         raise HTTPException(status_code=403, detail="Not authorized to delete this VOD")
     db.delete(vod)
     db.commit()
+    forget_vod_path(vod_id)
+    response_cache.invalidate("vods")
     return None
 
-@router.post("/webhook/recording-complete")
-async def recording_complete_webhook(request: Request, db: Session = Depends(get_db)):
-    data = None
-    try:
-        data = await request.json()
-    except Exception:
-        data = await request.form()
+@router.post("/webhook/recording-complete", status_code=status.HTTP_202_ACCEPTED)
+async def recording_complete_webhook(request: Request, db: AsyncSession = Depends(get_async_db)):
+    data = await read_webhook_payload(request)
     stream_key = data.get("name") or data.get("stream_key")
     file_path = data.get("path") or data.get("file_path")
     if not stream_key or not file_path:
         raise HTTPException(status_code=400, detail="Missing stream_key or file_path")
-    stream = db.query(Stream).filter(Stream.stream_key == stream_key).first()
-    if not stream:
+    # Stored relative to the recordings root, so nothing outside it can ever be probed or served
+    try:
+        file_path = relative_recording_path(file_path)
+    except RecordingNotFound:
+        raise HTTPException(status_code=400, detail="file_path is outside the recordings directory")
+    except RecordingStorageUnavailable:
+        raise HTTPException(status_code=503, detail="Recording storage is not configured")
+    stream_id = await resolve_stream_id(db, stream_key)
+    if stream_id is None:
         raise HTTPException(status_code=404, detail="Stream not found")
-    vod = VOD(
-        stream_id=stream.id,
-        file_path=file_path.lstrip("/"),
-        created_at=datetime.utcnow(),
-        is_public=True
-    )
-    db.add(vod)
-    db.commit()
-    db.refresh(vod)
-    return {"id": vod.id, "file_path": vod.file_path} 
\ No newline at end of file
+    event = {"type": "recording", "stream_key": stream_key, "stream_id": stream_id, "file_path": file_path}
+    # Applied by the background consumer; only if Redis refuses the append is it written inline
+    queued = await enqueue_webhook(event)
+    if not queued:
+        await apply_webhook_events(db, [(None, event)])
+    return {"stream_id": stream_id, "file_path": event["file_path"], "queued": queued}
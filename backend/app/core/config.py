@@ -1,8 +1,9 @@
+from typing import Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from functools import lru_cache
 
 class Settings(BaseSettings):
-    model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
+    model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", case_sensitive=True)
 
     PROJECT_NAME: str = "VLS Backend"
     API_V1_STR: str = "/api/v1"
@@ -11,17 +12,100 @@ class Settings(BaseSettings):
     POSTGRES_USER: str
     POSTGRES_PASSWORD: str
     POSTGRES_DB: str
-    DATABASE_URL: str = None
+    DATABASE_URL: Optional[str] = None
+    REDIS_URL: str = "redis://localhost:6379/0"
+    # Backoff for the per-process pub/sub connection when Redis drops it
+    PUBSUB_RETRY_SECONDS: float = 0.5
+    PUBSUB_MAX_RETRY_SECONDS: float = 10
+    # Applied to both the sync and the async engine, per worker process
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_TIMEOUT: float = 30
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24
+    REFRESH_TOKEN_MAX_SESSIONS: int = 10
+    PRINCIPAL_CACHE_SIZE: int = 10000
+    PRINCIPAL_CACHE_TTL_SECONDS: float = 60
+    RESPONSE_CACHE_TTL_SECONDS: float = 5
 
-    class Config:
-        case_sensitive = True
+    # Password hashing; hashes at any other cost are upgraded on the next login
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_QUEUE_LIMIT: int = 64
+
+    # Auth audit log (NDJSON, written by a background thread)
+    AUDIT_LOG_PATH: str = "auth_audit.ndjson"
+    AUDIT_QUEUE_SIZE: int = 10000
+    AUDIT_OVERFLOW_POLICY: str = "drop_newest"  # or "drop_oldest"
+    AUDIT_BATCH_SIZE: int = 500
+    AUDIT_FLUSH_INTERVAL_MS: int = 200
+    AUDIT_ROTATE_BYTES: int = 50 * 1024 * 1024
+    AUDIT_ROTATE_SECONDS: float = 24 * 3600
+    AUDIT_BACKUP_COUNT: int = 14
+    AUDIT_COMPRESS_ROTATED: bool = True
+
+    # Signed playback URLs; falls back to SECRET_KEY when no dedicated key is set
+    PLAYBACK_SIGNING_KEY: Optional[str] = None
+    PLAYBACK_URL_TTL_SECONDS: int = 3600
+
+    # Presence
+    PRESENCE_HEARTBEAT_SECONDS: float = 10
+    PRESENCE_WORKER_TTL_SECONDS: float = 30
+    PRESENCE_UNIQUES_TTL_SECONDS: int = 7 * 24 * 3600
+
+    # Webhook queue (Redis Streams, partitioned by stream key)
+    WEBHOOK_QUEUE_PARTITIONS: int = 8
+    WEBHOOK_QUEUE_MAXLEN: int = 100000
+    WEBHOOK_BATCH_SIZE: int = 200
+    WEBHOOK_BLOCK_MS: int = 200
+    WEBHOOK_LEASE_MS: int = 10000
+    WEBHOOK_MAX_ATTEMPTS: int = 5
+    # How long a cached stream key -> id lookup authorizes a publish without the database
+    WEBHOOK_STREAM_KEY_TTL_SECONDS: int = 300
+
+    # Directory nginx-rtmp records into. Recordings are only probed and served from
+    # under it, and neither happens until it is set.
+    VOD_STORAGE_ROOT: Optional[str] = None
+    VOD_PROCESS_POOL_SIZE: int = 2
+    VOD_PROCESS_CONCURRENCY: int = 4
+    VOD_PROCESS_MAX_ATTEMPTS: int = 5
+    VOD_PROCESS_RETRY_SECONDS: float = 5
+    VOD_PROCESS_LOCK_SECONDS: int = 300
+
+    # Recordings served by the backend itself (/recordings)
+    VOD_FILE_CACHE_SIZE: int = 256
+    VOD_FILE_CACHE_TTL_SECONDS: float = 5
+
+    # Chat delivery
+    CHAT_SEND_QUEUE_SIZE: int = 256
+    CHAT_SLOW_CONSUMER_POLICY: str = "drop_oldest"  # or "disconnect"
+    CHAT_SLOW_CONSUMER_CLOSE_CODE: int = 4008
+    # Rooms at or above either threshold coalesce messages into one frame per window
+    CHAT_BATCH_WINDOW_MS: int = 100
+    CHAT_BATCH_MIN_VIEWERS: int = 1000
+    CHAT_BATCH_MIN_RATE: float = 20.0
+
+    # Chat persistence (write-behind)
+    CHAT_FLUSH_INTERVAL_MS: int = 50
+    CHAT_FLUSH_BATCH_SIZE: int = 500
+    CHAT_WRITE_BUFFER_SIZE: int = 50000
+    CHAT_ID_BLOCK_SIZE: int = 1000
+
+    # Chat rate limits (token buckets); streams may override the rates
+    CHAT_USER_RATE: float = 1.0
+    CHAT_USER_BURST: int = 5
+    CHAT_STREAM_RATE: float = 100.0
+    CHAT_STREAM_BURST: int = 300
 
     def assemble_db_connection(self):
         if self.DATABASE_URL:
             return self.DATABASE_URL
         return f"postgresql+psycopg2://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_SERVER}/{self.POSTGRES_DB}"
 
+    def assemble_async_db_connection(self):
+        _, location = self.assemble_db_connection().split("://", 1)
+        return f"postgresql+asyncpg://{location}"
+
 @lru_cache
 def get_settings():
     return Settings() 
\ No newline at end of file
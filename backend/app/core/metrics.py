@@ -0,0 +1,21 @@
+from collections import defaultdict
+from typing import Callable, Dict
+import threading
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = defaultdict(float)
+_gauges: Dict[str, Callable[[], float]] = {}
+
+def incr(name: str, value: float = 1):
+    with _lock:
+        _counters[name] += value
+
+def register_gauge(name: str, fn: Callable[[], float]):
+    _gauges[name] = fn
+
+def snapshot() -> dict:
+    with _lock:
+        data = dict(_counters)
+    for name, fn in list(_gauges.items()):
+        data[name] = fn()
+    return data
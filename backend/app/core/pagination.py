@@ -0,0 +1,43 @@
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
+from fastapi import HTTPException
+from pydantic import BaseModel
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+def encode_cursor(created_at: datetime, id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def parse_fields(fields: Optional[str], schema: type[BaseModel]) -> List[str]:
+    """Validate a comma-separated ``fields=`` projection against a read schema."""
+    if not fields:
+        return list(schema.model_fields)
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in schema.model_fields]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return list(dict.fromkeys(requested))
+
+def page_items(rows: Sequence, fields: List[str], limit: int) -> Tuple[List[dict], Optional[str]]:
+    """Turn projected rows into response dicts plus the cursor of the next page.
+
+    Rows must carry ``created_at`` and ``id`` in addition to the requested
+    fields; fields that are not columns come out as None for the caller to fill.
+    """
+    items = [{field: getattr(row, field, None) for field in fields} for row in rows]
+    next_cursor = None
+    if len(rows) == limit:
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return items, next_cursor
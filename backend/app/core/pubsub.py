@@ -0,0 +1,117 @@
+from typing import Callable, Dict, Optional, Set
+from app.core.config import get_settings
+from app.core.redis import async_redis_client
+from app.core import metrics
+import asyncio
+import redis
+
+settings = get_settings()
+
+class PubSubHub:
+    """One Redis pub/sub connection per process, shared by every subscriber.
+
+    Channels are subscribed and unsubscribed on that connection as handlers
+    come and go; changes are applied one at a time against the current set
+    of handlers, so the server side always converges on it. When Redis drops
+    the connection the listener reconnects with backoff, subscribes every
+    channel again and calls each channel's on_reconnect, since whatever was
+    published in the gap is lost.
+    """
+
+    def __init__(self, retry_seconds: float, max_retry_seconds: float):
+        self.retry_seconds = retry_seconds
+        self.max_retry_seconds = max_retry_seconds
+        self.handlers: Dict[str, Callable[[str], None]] = {}
+        self.reconnect_handlers: Dict[str, Callable[[], None]] = {}
+        self.connected = asyncio.Event()
+        self._pubsub = None
+        self._lock = asyncio.Lock()
+        self._task = None
+        self._background: Set[asyncio.Task] = set()
+        metrics.register_gauge("pubsub.channels", lambda: len(self.handlers))
+
+    async def subscribe(self, channel: str, handler: Callable[[str], None], on_reconnect: Optional[Callable[[], None]] = None):
+        self.handlers[channel] = handler
+        if on_reconnect:
+            self.reconnect_handlers[channel] = on_reconnect
+        await self._apply(channel)
+
+    def unsubscribe(self, channel: str):
+        # The handler goes at once, so a subscribe that follows is never undone by this one
+        self.handlers.pop(channel, None)
+        self.reconnect_handlers.pop(channel, None)
+        task = asyncio.create_task(self._apply(channel))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _apply(self, channel: str):
+        async with self._lock:
+            pubsub = self._pubsub
+            if pubsub is None:
+                # Not connected: the listener subscribes every channel once it is
+                return
+            try:
+                if channel in self.handlers:
+                    await pubsub.subscribe(channel)
+                else:
+                    await pubsub.unsubscribe(channel)
+            except redis.RedisError:
+                # The listener sees the broken connection too and reconnects
+                metrics.incr("pubsub.command_errors")
+
+    def start(self):
+        # Fresh primitives for the running loop, which may not be the one the last start() ran on
+        self.connected = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        # On Python 3.11 wait_for drops a cancel that races a reply (an unsubscribe ack, say), so repeat it
+        while task and not task.done():
+            task.cancel()
+            await asyncio.wait({task}, timeout=0.1)
+
+    async def _run(self):
+        delay = 0.0
+        reconnecting = False
+        while True:
+            if delay:
+                await asyncio.sleep(delay)
+            pubsub = async_redis_client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.connect()
+                async with self._lock:
+                    if self.handlers:
+                        await pubsub.subscribe(*self.handlers)
+                    self._pubsub = pubsub
+                self.connected.set()
+                if reconnecting:
+                    metrics.incr("pubsub.reconnects")
+                    for on_reconnect in list(self.reconnect_handlers.values()):
+                        on_reconnect()
+                delay = 0.0
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=None)
+                    if message is None or message["type"] != "message":
+                        continue
+                    handler = self.handlers.get(message["channel"])
+                    if handler is None:
+                        continue
+                    try:
+                        handler(message["data"])
+                    except Exception:
+                        metrics.incr("pubsub.handler_errors")
+            except (redis.RedisError, OSError):
+                metrics.incr("pubsub.disconnects")
+            finally:
+                self.connected.clear()
+                self._pubsub = None
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+            reconnecting = True
+            delay = min(max(delay * 2, self.retry_seconds), self.max_retry_seconds)
+
+pubsub_hub = PubSubHub(settings.PUBSUB_RETRY_SECONDS, settings.PUBSUB_MAX_RETRY_SECONDS)
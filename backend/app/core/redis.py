@@ -1,6 +1,8 @@
 import redis
+import redis.asyncio
 from app.core.config import get_settings
 
 settings = get_settings()
 
-redis_client = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True) 
\ No newline at end of file
+redis_client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+async_redis_client = redis.asyncio.Redis.from_url(settings.REDIS_URL, decode_responses=True)
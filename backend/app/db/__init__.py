@@ -1 +1 @@
-from .session import SessionLocal, engine
+from .session import SessionLocal, engine, AsyncSessionLocal, async_engine
@@ -0,0 +1,32 @@
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from app.core import metrics
+import time
+
+class CheckoutTimingMixin:
+    """Records how long each connection checkout waited on the pool."""
+
+    metrics_prefix = "db.pool"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            metrics.incr(f"{self.metrics_prefix}.checkout_timeouts")
+            raise
+        finally:
+            metrics.incr(f"{self.metrics_prefix}.checkouts")
+            metrics.incr(f"{self.metrics_prefix}.checkout_wait_seconds", time.perf_counter() - start)
+
+class InstrumentedQueuePool(CheckoutTimingMixin, QueuePool):
+    metrics_prefix = "db.pool"
+
+class InstrumentedAsyncPool(CheckoutTimingMixin, AsyncAdaptedQueuePool):
+    metrics_prefix = "db.async_pool"
+
+def register_pool_gauges(engine, prefix: str, capacity: int):
+    # engine.pool is looked up on every read so a dispose()/recreate is followed
+    metrics.register_gauge(f"{prefix}.checked_out", lambda: engine.pool.checkedout())
+    metrics.register_gauge(f"{prefix}.overflow", lambda: max(engine.pool.overflow(), 0))
+    metrics.register_gauge(f"{prefix}.utilization", lambda: engine.pool.checkedout() / capacity)
@@ -1,10 +1,28 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
 from app.core.config import get_settings
+from app.db.pool import InstrumentedAsyncPool, InstrumentedQueuePool, register_pool_gauges
 
 settings = get_settings()
 
 SQLALCHEMY_DATABASE_URL = settings.assemble_db_connection()
+SQLALCHEMY_ASYNC_DATABASE_URL = settings.assemble_async_db_connection()
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL, pool_pre_ping=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine) 
\ No newline at end of file
+POOL_OPTIONS = dict(
+    pool_pre_ping=True,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+)
+POOL_CAPACITY = settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, poolclass=InstrumentedQueuePool, **POOL_OPTIONS)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+register_pool_gauges(engine, "db.pool", POOL_CAPACITY)
+
+# Used by async def handlers (WebSocket chat, RTMP webhooks) so queries never block the event loop
+async_engine = create_async_engine(SQLALCHEMY_ASYNC_DATABASE_URL, poolclass=InstrumentedAsyncPool, **POOL_OPTIONS)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+register_pool_gauges(async_engine, "db.async_pool", POOL_CAPACITY)
@@ -1 +1,16 @@
-# Import dependencies here
+from app.db.session import SessionLocal, AsyncSessionLocal
+
+# The one request-scoped session dependency. FastAPI resolves a dependency
+# once per request, so the auth dependencies and the endpoint share a
+# session (and its pooled connection) instead of checking out one each.
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,11 +1,47 @@
+from contextlib import AsyncExitStack, asynccontextmanager
 from fastapi import FastAPI
 from app.api import router as api_router
+from app.core import metrics
+from app.core.pubsub import pubsub_hub
+from app.services.chat import chat_writer
+from app.services.presence import presence_tracker
+from app.services.webhook_queue import webhook_applier
+from app.services.vod_processing import vod_processor
+from app.services.passwords import password_hasher
+from app.services.audit import audit_log
+from app.services.principals import subscribe_invalidations
 
-app = FastAPI(title="VLS Backend", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Stops run in reverse order, and each one runs even if an earlier one raised,
+    # so e.g. Redis being down at shutdown cannot keep the chat buffer from draining
+    async with AsyncExitStack() as stack:
+        pubsub_hub.start()
+        stack.push_async_callback(pubsub_hub.stop)
+        await subscribe_invalidations()
+        chat_writer.start()
+        stack.push_async_callback(chat_writer.stop)
+        presence_tracker.start()
+        stack.push_async_callback(presence_tracker.stop)
+        audit_log.start()
+        stack.callback(audit_log.stop)
+        password_hasher.start()
+        stack.callback(password_hasher.stop)
+        vod_processor.start()
+        stack.push_async_callback(vod_processor.stop)
+        webhook_applier.start()
+        stack.push_async_callback(webhook_applier.stop)
+        yield
+
+app = FastAPI(title="VLS Backend", version="1.0.0", lifespan=lifespan)
 
 @app.get("/health", tags=["Health"])
 def health_check():
     return {"status": "ok"}
 
+@app.get("/metrics", tags=["Health"])
+def read_metrics():
+    return metrics.snapshot()
+
 # Include API router (to be implemented)
 app.include_router(api_router)
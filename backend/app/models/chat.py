@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, func, UniqueConstraint
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, func, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from app.models.user import Base
 
@@ -12,6 +12,8 @@ class ChatMessage(Base):
     timestamp = Column(DateTime, server_default=func.now(), nullable=False)
     is_deleted = Column(Boolean, default=False)
 
+    __table_args__ = (Index('ix_chat_messages_stream_id_timestamp_id', 'stream_id', 'timestamp', 'id'),)
+
     stream = relationship("Stream", backref="chat_messages")
     user = relationship("User")
 
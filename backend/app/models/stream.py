@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Enum, DateTime, Boolean, ForeignKey, func
+from sqlalchemy import Column, Integer, String, Text, Enum, DateTime, Boolean, Float, ForeignKey, Index, func
 from sqlalchemy.orm import relationship
 from app.models.user import Base
 import enum
@@ -20,7 +20,16 @@ class Stream(Base):
     stream_key = Column(String(64), unique=True, nullable=False, index=True)
     owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     is_public = Column(Boolean, default=True)
+    chat_user_rate = Column(Float, nullable=True)  # messages/second per user, None = default
+    chat_stream_rate = Column(Float, nullable=True)  # messages/second per stream, None = default
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
 
+    __table_args__ = (
+        Index('ix_streams_created_at_id', 'created_at', 'id'),
+        Index('ix_streams_status_is_public_created_at_id', 'status', 'is_public', 'created_at', 'id'),
+        Index('ix_streams_is_public_created_at_id', 'is_public', 'created_at', 'id'),
+        Index('ix_streams_owner_id_created_at_id', 'owner_id', 'created_at', 'id'),
+    )
+
     owner = relationship("User", backref="streams") 
\ No newline at end of file
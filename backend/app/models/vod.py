@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, func
+from sqlalchemy import BigInteger, Column, Integer, String, DateTime, Boolean, ForeignKey, Index, func
 from sqlalchemy.orm import relationship
 from app.models.user import Base
 
@@ -10,8 +10,20 @@ class VOD(Base):
     file_path = Column(String, nullable=False)
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
     duration = Column(Integer, nullable=True)  # seconds
+    # Filled by post-processing; format stays NULL until the file has been probed
+    # and becomes "unknown" once it is known it never can be
+    size_bytes = Column(BigInteger, nullable=True)
+    format = Column(String(16), nullable=True)
+    bitrate = Column(Integer, nullable=True)  # bits per second
     title = Column(String(255), nullable=True)
     description = Column(String, nullable=True)
     is_public = Column(Boolean, default=True)
 
+    __table_args__ = (
+        Index('ix_vods_created_at_id', 'created_at', 'id'),
+        Index('ix_vods_is_public_created_at_id', 'is_public', 'created_at', 'id'),
+        # Also makes recording-complete deliveries idempotent
+        Index('uq_vods_stream_id_file_path', 'stream_id', 'file_path', unique=True),
+    )
+
     stream = relationship("Stream", backref="vods") 
\ No newline at end of file
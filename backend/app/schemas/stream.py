@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional
 from datetime import datetime
 from app.models.stream import StreamStatus
@@ -15,6 +15,8 @@ class StreamUpdate(StreamBase):
     status: Optional[StreamStatus] = None
     start_time: Optional[datetime] = None
     end_time: Optional[datetime] = None
+    chat_user_rate: Optional[float] = Field(None, gt=0)
+    chat_stream_rate: Optional[float] = Field(None, gt=0)
 
 class StreamRead(StreamBase):
     id: int
@@ -23,7 +25,15 @@ class StreamRead(StreamBase):
     end_time: Optional[datetime] = None
     stream_key: str
     owner_id: int
+    chat_user_rate: Optional[float] = None
+    chat_stream_rate: Optional[float] = None
     created_at: datetime
     updated_at: datetime
+    # Filled from Redis presence, not stored on the row
+    viewer_count: Optional[int] = None
 
-    model_config = {"from_attributes": True} 
\ No newline at end of file
+    model_config = {"from_attributes": True}
+
+class StreamStatusChange(BaseModel):
+    id: int
+    status: StreamStatus
@@ -18,5 +18,8 @@ class VODRead(VODBase):
     file_path: str
     created_at: datetime
     duration: Optional[int] = None
+    size_bytes: Optional[int] = None
+    format: Optional[str] = None
+    bitrate: Optional[int] = None
 
     model_config = {"from_attributes": True} 
\ No newline at end of file
@@ -0,0 +1,137 @@
+from datetime import datetime
+from typing import List, Optional
+from app.core.config import get_settings
+from app.core import metrics
+import glob
+import gzip
+import orjson
+import os
+import queue
+import shutil
+import threading
+import time
+
+settings = get_settings()
+
+_STOP = object()
+
+class AuditLog:
+    """Queue-backed NDJSON audit sink.
+
+    record() only builds a dict and enqueues it; a background thread writes
+    batches, rotating the file by size or age and optionally gzipping what
+    it rotates out. When the queue is full the overflow policy decides
+    which record is lost: "drop_newest" discards the incoming one,
+    "drop_oldest" makes room by discarding the oldest queued one.
+    """
+
+    def __init__(self, path: str, queue_size: int, overflow_policy: str, batch_size: int, flush_interval_ms: int,
+                 rotate_bytes: int, rotate_seconds: float, backup_count: int, compress: bool):
+        self.path = path
+        self.queue: queue.Queue = queue.Queue(queue_size)
+        self.overflow_policy = overflow_policy
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.backup_count = backup_count
+        self.compress = compress
+        self._file = None
+        self._opened_at = 0.0
+        self._thread: Optional[threading.Thread] = None
+        metrics.register_gauge("audit.queued", self.queue.qsize)
+
+    def record(self, event: str, **fields):
+        entry = {"ts": time.time(), "event": event, **fields}
+        try:
+            self.queue.put_nowait(entry)
+            return
+        except queue.Full:
+            pass
+        metrics.incr("audit.dropped")
+        if self.overflow_policy == "drop_oldest":
+            try:
+                self.queue.get_nowait()
+                self.queue.put_nowait(entry)
+            except (queue.Empty, queue.Full):
+                pass
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread:
+            # Blocking put: the sentinel must get in even if the queue is full
+            self.queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while True:
+            try:
+                batch = [self.queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                self._maybe_rotate()
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = any(entry is _STOP for entry in batch)
+            records = [entry for entry in batch if entry is not _STOP]
+            if records:
+                self._write(records)
+            if stopping:
+                self._close()
+                return
+
+    def _write(self, records: List[dict]):
+        try:
+            if self._file is None:
+                self._open()
+            self._file.write(b"".join(orjson.dumps(entry, default=str) + b"\n" for entry in records))
+            self._file.flush()
+            metrics.incr("audit.written", len(records))
+        except OSError:
+            metrics.incr("audit.write_errors", len(records))
+            self._close()
+            return
+        self._maybe_rotate()
+
+    def _open(self):
+        self._file = open(self.path, "ab")
+        self._opened_at = time.time()
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _maybe_rotate(self):
+        if self._file is None:
+            return
+        if self._file.tell() < self.rotate_bytes and time.time() - self._opened_at < self.rotate_seconds:
+            return
+        if self._file.tell() == 0:
+            self._opened_at = time.time()
+            return
+        self._close()
+        try:
+            rotated = f"{self.path}.{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}"
+            os.replace(self.path, rotated)
+            if self.compress:
+                with open(rotated, "rb") as src, gzip.open(rotated + ".gz", "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                os.remove(rotated)
+            for old in sorted(glob.glob(f"{glob.escape(self.path)}.*"))[:-self.backup_count or None]:
+                os.remove(old)
+        except OSError:
+            metrics.incr("audit.rotate_errors")
+
+audit_log = AuditLog(
+    settings.AUDIT_LOG_PATH, settings.AUDIT_QUEUE_SIZE, settings.AUDIT_OVERFLOW_POLICY, settings.AUDIT_BATCH_SIZE,
+    settings.AUDIT_FLUSH_INTERVAL_MS, settings.AUDIT_ROTATE_BYTES, settings.AUDIT_ROTATE_SECONDS,
+    settings.AUDIT_BACKUP_COUNT, settings.AUDIT_COMPRESS_ROTATED,
+)
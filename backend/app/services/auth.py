@@ -1,4 +1,3 @@
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
 from jose import jwt
 from typing import Optional
@@ -6,26 +5,31 @@ from app.core.config import get_settings
 from jose import JWTError
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app.models import User
-from app.db.session import SessionLocal
+from app.dependencies import get_db, get_async_db
 from app.models.user import UserRole
-from app.core.redis import redis_client
+from app.core.redis import redis_client, async_redis_client
+from app.services.principals import principal_cache
+from app.services.passwords import password_context
+import base64
+import hashlib
 import secrets
+import time
 
 settings = get_settings()
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 ALGORITHM = "HS256"
 
-# Password hashing
+# Password hashing (blocking; request handlers go through password_hasher instead)
 
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return password_context(settings.BCRYPT_ROUNDS).hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_context(settings.BCRYPT_ROUNDS).verify(plain_password, hashed_password)
 
 # JWT creation
 
@@ -40,30 +44,42 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
+def credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def decode_token_subject(token: str) -> str:
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
         if email is None:
-            raise credentials_exception
+            raise credentials_exception()
     except JWTError:
-        raise credentials_exception
+        raise credentials_exception()
+    return email
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    email = decode_token_subject(token)
+    user = principal_cache.get(token)
+    if user is not None:
+        return user
     user = db.query(User).filter(User.email == email).first()
     if user is None:
-        raise credentials_exception
-    return user 
+        raise credentials_exception()
+    return principal_cache.put(token, user)
+
+async def get_current_user_async(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    email = decode_token_subject(token)
+    user = principal_cache.get(token)
+    if user is not None:
+        return user
+    user = (await db.execute(select(User).where(User.email == email))).scalars().first()
+    if user is None:
+        raise credentials_exception()
+    return principal_cache.put(token, user)
 
 def require_role(role: UserRole):
     def role_checker(current_user = Depends(get_current_user)):
@@ -81,16 +97,85 @@ def require_roles(roles: list[UserRole]):
 
 REFRESH_TOKEN_EXPIRE_DAYS = 7
 
-def create_refresh_token(email: str) -> str:
-    refresh_token = secrets.token_urlsafe(32)
-    redis_client.set(f"refresh_token:{refresh_token}", email, ex=REFRESH_TOKEN_EXPIRE_DAYS * 24 * 3600)
-    return refresh_token
+# Refresh tokens are "<base64url(email)>.<secret>". Each user's live tokens
+# are fields of one hash, refresh_family:<email>, mapping a digest of the
+# secret to its expiry in ms; deleting the hash revokes them all at once.
+
+# Adds a token, drops expired ones and, past the cap, the oldest.
+# KEYS: family; ARGV: digest, expires ms, max sessions, family ttl seconds
+ADD_REFRESH_TOKEN_SCRIPT = """
+local now = redis.call('TIME')
+local now_ms = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+local entries = redis.call('HGETALL', KEYS[1])
+local live, oldest, oldest_expiry = 0, nil, nil
+for i = 1, #entries, 2 do
+    local expiry = tonumber(entries[i + 1])
+    if expiry <= now_ms then
+        redis.call('HDEL', KEYS[1], entries[i])
+    else
+        live = live + 1
+        if oldest_expiry == nil or expiry < oldest_expiry then
+            oldest, oldest_expiry = entries[i], expiry
+        end
+    end
+end
+if live > tonumber(ARGV[3]) then
+    redis.call('HDEL', KEYS[1], oldest)
+end
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return live
+"""
+
+_add_refresh_token = async_redis_client.register_script(ADD_REFRESH_TOKEN_SCRIPT)
+
+def refresh_family_key(email: str) -> str:
+    return f"refresh_family:{email}"
+
+def _token_digest(secret: str) -> str:
+    return base64.urlsafe_b64encode(hashlib.sha256(secret.encode()).digest()[:16]).decode().rstrip("=")
+
+def _parse_refresh_token(refresh_token: str):
+    encoded_email, _, secret = refresh_token.partition(".")
+    try:
+        email = base64.urlsafe_b64decode(encoded_email + "=" * (-len(encoded_email) % 4)).decode()
+    except (ValueError, UnicodeDecodeError):
+        email = None
+    if not email or not secret:
+        raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
+    return email, _token_digest(secret)
+
+async def create_refresh_token(email: str) -> str:
+    # Async because it is only issued from the async register/login handlers
+    secret = secrets.token_urlsafe(32)
+    ttl = REFRESH_TOKEN_EXPIRE_DAYS * 24 * 3600
+    expires_ms = int((time.time() + ttl) * 1000)
+    await _add_refresh_token(
+        keys=[refresh_family_key(email)],
+        args=[_token_digest(secret), expires_ms, settings.REFRESH_TOKEN_MAX_SESSIONS, ttl],
+    )
+    encoded_email = base64.urlsafe_b64encode(email.encode()).decode().rstrip("=")
+    return f"{encoded_email}.{secret}"
 
 def verify_refresh_token(refresh_token: str) -> str:
-    email = redis_client.get(f"refresh_token:{refresh_token}")
-    if not email:
+    if "." not in refresh_token:
+        # Standalone keys from before token families; they age out within REFRESH_TOKEN_EXPIRE_DAYS
+        email = redis_client.get(f"refresh_token:{refresh_token}")
+        if not email:
+            raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
+        return email
+    email, digest = _parse_refresh_token(refresh_token)
+    expires_ms = redis_client.hget(refresh_family_key(email), digest)
+    if not expires_ms or int(expires_ms) <= time.time() * 1000:
         raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
     return email
 
 def revoke_refresh_token(refresh_token: str):
-    redis_client.delete(f"refresh_token:{refresh_token}") 
\ No newline at end of file
+    if "." not in refresh_token:
+        redis_client.delete(f"refresh_token:{refresh_token}")
+        return
+    email, digest = _parse_refresh_token(refresh_token)
+    redis_client.hdel(refresh_family_key(email), digest)
+
+def revoke_all_refresh_tokens(email: str):
+    redis_client.delete(refresh_family_key(email)) 
\ No newline at end of file
@@ -0,0 +1,157 @@
+from collections import deque
+from typing import Deque, List
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from app.db.session import AsyncSessionLocal
+from app.models import ChatMessage
+from app.core.config import get_settings
+from app.core import metrics
+import asyncio
+import time
+
+settings = get_settings()
+
+MAX_CONTENT_LENGTH = ChatMessage.__table__.c.content.type.length
+SHUTDOWN_FLUSH_ATTEMPTS = 5
+ID_RETRY_SECONDS = 0.5
+ID_MAX_RETRY_SECONDS = 10
+
+class ChatIdsUnavailable(Exception):
+    pass
+
+class ChatMessageIdAllocator:
+    """Hands out chat_messages ids from blocks reserved on the table's sequence,
+    so a message can be broadcast before it is written.
+
+    Ids are unique but, with each worker drawing on its own block, only
+    ordered within a worker; history is ordered by (timestamp, id) instead.
+    If a block cannot be reserved, next_id() raises ChatIdsUnavailable
+    straight away until a backoff has passed, so an outage costs the
+    messages sent during it rather than a query each.
+    """
+
+    def __init__(self, block_size: int):
+        self.block_size = block_size
+        self._ids: Deque[int] = deque()
+        self._lock = asyncio.Lock()
+        self._failures = 0
+        self._retry_at = 0.0
+
+    async def next_id(self) -> int:
+        while not self._ids:
+            async with self._lock:
+                if self._ids:
+                    break
+                if time.monotonic() < self._retry_at:
+                    raise ChatIdsUnavailable()
+                try:
+                    self._ids.extend(await self._reserve())
+                except Exception as e:
+                    metrics.incr("chat.id_reserve_failures")
+                    self._retry_at = time.monotonic() + min(ID_RETRY_SECONDS * 2 ** self._failures, ID_MAX_RETRY_SECONDS)
+                    self._failures += 1
+                    raise ChatIdsUnavailable() from e
+                self._failures = 0
+        return self._ids.popleft()
+
+    async def _reserve(self) -> List[int]:
+        async with AsyncSessionLocal() as db:
+            rows = await db.execute(
+                text("SELECT nextval(pg_get_serial_sequence('chat_messages', 'id')) FROM generate_series(1, :n)"),
+                {"n": self.block_size},
+            )
+            return [row[0] for row in rows]
+
+class ChatMessageWriter:
+    """Write-behind buffer flushing chat messages with multi-row inserts.
+
+    Rows are flushed every CHAT_FLUSH_INTERVAL_MS or as soon as
+    CHAT_FLUSH_BATCH_SIZE are pending. While the database is unavailable rows
+    stay buffered up to CHAT_WRITE_BUFFER_SIZE; beyond that submit() refuses
+    new messages. stop() drains whatever is left, retrying a few times if the
+    database is still failing.
+    """
+
+    def __init__(self, batch_size: int, interval_ms: int, max_buffer: int):
+        self.batch_size = batch_size
+        self.interval = interval_ms / 1000
+        self.max_buffer = max_buffer
+        self.buffer: Deque[dict] = deque()
+        self._wakeup = asyncio.Event()
+        self._closing = False
+        self._task = None
+        metrics.register_gauge("chat.persist_buffer", lambda: len(self.buffer))
+
+    def submit(self, row: dict) -> bool:
+        if len(self.buffer) >= self.max_buffer:
+            metrics.incr("chat.persist_rejected")
+            return False
+        self.buffer.append(row)
+        if len(self.buffer) >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def start(self):
+        self._closing = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._closing = True
+        self._wakeup.set()
+        if self._task:
+            await self._task
+            self._task = None
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if not await self.flush():
+                await asyncio.sleep(self.interval)
+        for attempt in range(SHUTDOWN_FLUSH_ATTEMPTS):
+            if await self.flush():
+                return
+            await asyncio.sleep(self.interval * 2 ** attempt)
+        metrics.incr("chat.persist_lost", len(self.buffer))
+
+    async def flush(self) -> bool:
+        while self.buffer:
+            batch = [self.buffer[i] for i in range(min(len(self.buffer), self.batch_size))]
+            try:
+                written = await self._insert(batch)
+            except Exception:
+                metrics.incr("chat.persist_failures")
+                return False
+            for _ in batch:
+                self.buffer.popleft()
+            metrics.incr("chat.messages_persisted", written)
+            metrics.incr("chat.persist_dropped", len(batch) - written)
+        return True
+
+    async def _insert(self, rows: List[dict]) -> int:
+        # ON CONFLICT keeps retries of a batch whose commit outcome was lost idempotent
+        statement = insert(ChatMessage).on_conflict_do_nothing(index_elements=["id"])
+        async with AsyncSessionLocal() as db:
+            try:
+                await db.execute(statement, rows)
+                await db.commit()
+                return len(rows)
+            except IntegrityError:
+                await db.rollback()
+            # A row referencing a deleted stream or user must not poison the batch
+            written = 0
+            for row in rows:
+                try:
+                    await db.execute(statement, row)
+                    await db.commit()
+                    written += 1
+                except IntegrityError:
+                    await db.rollback()
+            return written
+
+chat_ids = ChatMessageIdAllocator(settings.CHAT_ID_BLOCK_SIZE)
+chat_writer = ChatMessageWriter(settings.CHAT_FLUSH_BATCH_SIZE, settings.CHAT_FLUSH_INTERVAL_MS, settings.CHAT_WRITE_BUFFER_SIZE)
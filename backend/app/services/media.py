@@ -0,0 +1,152 @@
+"""Pure-Python probing of recording headers (FLV and MP4).
+
+Kept free of app imports so process-pool workers can load it cheaply.
+Run `python -m app.services.media FILE...` to probe sample files locally.
+"""
+from typing import BinaryIO, NamedTuple, Optional
+import os
+import struct
+import sys
+
+class MediaInfo(NamedTuple):
+    format: str
+    size_bytes: int
+    duration: Optional[float]  # seconds
+    bitrate: Optional[int]  # bits per second, averaged over the file
+
+class MediaError(ValueError):
+    pass
+
+# AMF0 type markers used in FLV script data
+AMF_NUMBER, AMF_BOOLEAN, AMF_STRING, AMF_OBJECT = 0x00, 0x01, 0x02, 0x03
+AMF_NULL, AMF_UNDEFINED, AMF_REFERENCE, AMF_ECMA_ARRAY = 0x05, 0x06, 0x07, 0x08
+AMF_OBJECT_END, AMF_STRICT_ARRAY, AMF_DATE, AMF_LONG_STRING = 0x09, 0x0A, 0x0B, 0x0C
+
+FLV_SCRIPT_TAG = 18
+
+def _amf_string(data: bytes, pos: int):
+    length, = struct.unpack_from(">H", data, pos)
+    return data[pos + 2:pos + 2 + length].decode("utf-8", "replace"), pos + 2 + length
+
+def _amf_properties(data: bytes, pos: int):
+    values = {}
+    while pos + 3 <= len(data):
+        if data[pos:pos + 3] == b"\x00\x00\x09":
+            return values, pos + 3
+        key, pos = _amf_string(data, pos)
+        values[key], pos = _amf_value(data, pos)
+    return values, pos
+
+def _amf_value(data: bytes, pos: int):
+    marker = data[pos]
+    pos += 1
+    if marker == AMF_NUMBER:
+        return struct.unpack_from(">d", data, pos)[0], pos + 8
+    if marker == AMF_BOOLEAN:
+        return bool(data[pos]), pos + 1
+    if marker == AMF_STRING:
+        return _amf_string(data, pos)
+    if marker == AMF_LONG_STRING:
+        length, = struct.unpack_from(">I", data, pos)
+        return data[pos + 4:pos + 4 + length].decode("utf-8", "replace"), pos + 4 + length
+    if marker == AMF_OBJECT:
+        return _amf_properties(data, pos)
+    if marker == AMF_ECMA_ARRAY:
+        return _amf_properties(data, pos + 4)
+    if marker == AMF_STRICT_ARRAY:
+        count, = struct.unpack_from(">I", data, pos)
+        pos += 4
+        items = []
+        for _ in range(count):
+            item, pos = _amf_value(data, pos)
+            items.append(item)
+        return items, pos
+    if marker == AMF_DATE:
+        return struct.unpack_from(">d", data, pos)[0], pos + 10
+    if marker == AMF_REFERENCE:
+        return None, pos + 2
+    if marker in (AMF_NULL, AMF_UNDEFINED):
+        return None, pos
+    raise MediaError(f"Unsupported AMF0 marker {marker:#x}")
+
+def _flv_duration(f: BinaryIO, size: int) -> Optional[float]:
+    header = f.read(9)
+    f.seek(struct.unpack_from(">I", header, 5)[0] + 4)
+    tag = f.read(11)
+    if len(tag) == 11 and tag[0] & 0x1F == FLV_SCRIPT_TAG:
+        data = f.read(int.from_bytes(tag[1:4], "big"))
+        try:
+            name, pos = _amf_value(data, 0)
+            if name == "onMetaData":
+                metadata, _ = _amf_value(data, pos)
+                duration = metadata.get("duration") if isinstance(metadata, dict) else None
+                if duration:
+                    return float(duration)
+        except (MediaError, struct.error, IndexError):
+            pass
+    # Live recordings often carry no duration: use the last tag's timestamp,
+    # found through the trailing PreviousTagSize field
+    if size < 15:
+        return None
+    f.seek(size - 4)
+    last_tag_size, = struct.unpack(">I", f.read(4))
+    if not 11 <= last_tag_size <= size - 4:
+        return None
+    f.seek(size - 4 - last_tag_size)
+    tag = f.read(11)
+    timestamp = int.from_bytes(tag[4:7], "big") | tag[7] << 24
+    return timestamp / 1000
+
+def _mp4_boxes(f: BinaryIO, start: int, end: int):
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        box_size, box_type = struct.unpack(">I4s", f.read(8))
+        header = 8
+        if box_size == 1:
+            box_size, = struct.unpack(">Q", f.read(8))
+            header = 16
+        elif box_size == 0:
+            box_size = end - pos
+        if box_size < header:
+            raise MediaError(f"Corrupt MP4 box at offset {pos}")
+        yield box_type, pos + header, pos + box_size
+        pos += box_size
+
+def _mp4_duration(f: BinaryIO, size: int) -> Optional[float]:
+    for box_type, start, end in _mp4_boxes(f, 0, size):
+        if box_type != b"moov":
+            continue
+        for child_type, child_start, _ in _mp4_boxes(f, start, end):
+            if child_type != b"mvhd":
+                continue
+            f.seek(child_start)
+            version = f.read(4)[0]
+            if version == 1:
+                _, _, timescale, duration = struct.unpack(">QQIQ", f.read(28))
+            else:
+                _, _, timescale, duration = struct.unpack(">IIII", f.read(16))
+            return duration / timescale if timescale else None
+    return None
+
+def probe(path: str) -> MediaInfo:
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        head = f.read(12)
+        f.seek(0)
+        try:
+            if head[:3] == b"FLV":
+                media_format, duration = "flv", _flv_duration(f, size)
+            elif head[4:8] in (b"ftyp", b"moov", b"mdat", b"free", b"wide"):
+                media_format, duration = "mp4", _mp4_duration(f, size)
+            else:
+                raise MediaError(f"Unrecognised container in {path}")
+        except (struct.error, IndexError):
+            # A header or box cut short by the end of the file
+            raise MediaError(f"Truncated recording {path}")
+    bitrate = int(size * 8 / duration) if duration else None
+    return MediaInfo(media_format, size, duration, bitrate)
+
+if __name__ == "__main__":
+    for path in sys.argv[1:]:
+        print(path, probe(path)._asdict())
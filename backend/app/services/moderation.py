@@ -0,0 +1,59 @@
+from typing import Dict, NamedTuple, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import ChatBan
+from app.core.redis import redis_client
+from app.core import metrics
+import json
+import redis
+
+MODERATION_CHANNEL_PREFIX = "chat:moderation:"
+
+def moderation_channel(stream_id: int) -> str:
+    return f"{MODERATION_CHANNEL_PREFIX}{stream_id}"
+
+class ModerationState(NamedTuple):
+    is_banned: bool = False
+    is_muted: bool = False
+
+class ModerationCache:
+    """Per-stream ban/mute state for users connected to this process.
+
+    Entries are loaded when a user connects and then kept current by updates
+    pushed over Redis from ban_or_mute_user, so the chat loop never queries
+    chat_bans per message.
+    """
+
+    def __init__(self):
+        self.states: Dict[int, Dict[int, ModerationState]] = {}
+
+    async def load(self, db: AsyncSession, stream_id: int, user_id: int) -> ModerationState:
+        result = await db.execute(select(ChatBan).where(ChatBan.stream_id == stream_id, ChatBan.user_id == user_id))
+        ban = result.scalars().first()
+        state = ModerationState(bool(ban and ban.is_banned), bool(ban and ban.is_muted))
+        self.states.setdefault(stream_id, {})[user_id] = state
+        return state
+
+    def get(self, stream_id: int, user_id: int) -> Optional[ModerationState]:
+        return self.states.get(stream_id, {}).get(user_id)
+
+    def apply(self, stream_id: int, user_id: int, state: ModerationState):
+        if stream_id in self.states:
+            self.states[stream_id][user_id] = state
+
+    def forget_stream(self, stream_id: int):
+        self.states.pop(stream_id, None)
+
+def publish_moderation_update(stream_id: int, user_id: int, is_banned: bool, is_muted: bool):
+    payload = {"user_id": user_id, "is_banned": is_banned, "is_muted": is_muted}
+    try:
+        redis_client.publish(moderation_channel(stream_id), json.dumps(payload))
+    except redis.RedisError:
+        # The ban is already committed; connected users pick it up when they next join
+        metrics.incr("moderation.publish_errors")
+
+def parse_moderation_update(data: str):
+    payload = json.loads(data)
+    return payload["user_id"], ModerationState(payload["is_banned"], payload["is_muted"])
+
+moderation_cache = ModerationCache()
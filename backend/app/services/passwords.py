@@ -0,0 +1,71 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Optional, Tuple
+from passlib.context import CryptContext
+from app.core.config import get_settings
+from app.core import metrics
+import asyncio
+import multiprocessing
+
+settings = get_settings()
+
+@lru_cache(maxsize=None)
+def password_context(rounds: int) -> CryptContext:
+    # min == max == the configured cost, so hashes made at any other cost are flagged for rehash
+    return CryptContext(
+        schemes=["bcrypt"], deprecated="auto",
+        bcrypt__default_rounds=rounds, bcrypt__min_rounds=rounds, bcrypt__max_rounds=rounds,
+    )
+
+# These run inside the pool's worker processes
+
+def _hash(password: str, rounds: int) -> str:
+    return password_context(rounds).hash(password)
+
+def _verify_and_update(password: str, hashed: str, rounds: int) -> Tuple[bool, Optional[str]]:
+    return password_context(rounds).verify_and_update(password, hashed)
+
+class PasswordHasherBusy(Exception):
+    pass
+
+class PasswordHasher:
+    """Runs bcrypt in a dedicated process pool so it neither holds the GIL
+    nor occupies Starlette's threadpool. At most PASSWORD_HASH_QUEUE_LIMIT
+    operations may be queued or running; beyond that callers get
+    PasswordHasherBusy and should shed the request."""
+
+    def __init__(self, workers: int, queue_limit: int, rounds: int):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.rounds = rounds
+        self.pending = 0
+        self._pool = None
+        metrics.register_gauge("auth.password_hash_pending", lambda: self.pending)
+
+    def start(self):
+        self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def stop(self):
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def _submit(self, fn, *args):
+        if self.pending >= self.queue_limit:
+            metrics.incr("auth.password_hash_shed")
+            raise PasswordHasherBusy()
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(_hash, password, self.rounds)
+
+    async def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """Returns (valid, new_hash); new_hash is set when the stored hash
+        used a different cost and should be replaced."""
+        return await self._submit(_verify_and_update, password, hashed, self.rounds)
+
+password_hasher = PasswordHasher(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_QUEUE_LIMIT, settings.BCRYPT_ROUNDS)
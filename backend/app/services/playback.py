@@ -0,0 +1,113 @@
+from typing import Dict, Iterable, Optional
+from urllib.parse import quote
+from sqlalchemy.orm import Session
+from app.models import Stream, VOD
+from app.core.config import get_settings
+from app.core.redis import redis_client
+from app.core import metrics
+import base64
+import hashlib
+import hmac
+import re
+import redis
+import time
+
+settings = get_settings()
+
+# nginx-rtmp's flat HLS layout: <key>.m3u8 and its segments <key>-<n>.ts
+HLS_FILE = re.compile(r"(?P<key>.+?)(?:-\d+\.ts|\.m3u8)")
+
+# Redis hashes of id -> the value a playback path is built from
+STREAM_PATHS_KEY = "playback_paths:streams"  # stream id -> stream_key
+VOD_PATHS_KEY = "playback_paths:vods"  # vod id -> file_path
+
+def _signing_key() -> bytes:
+    return (settings.PLAYBACK_SIGNING_KEY or settings.SECRET_KEY).encode()
+
+def sign_path(path: str, expires: int) -> str:
+    digest = hmac.new(_signing_key(), f"{expires}:{path}".encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).decode().rstrip("=")
+
+def verify_signed_path(path: str, expires: str, signature: str) -> bool:
+    """Check a playback request the way the edge does: no database, just the key."""
+    try:
+        if int(expires) < time.time():
+            return False
+    except (TypeError, ValueError):
+        return False
+    return hmac.compare_digest(sign_path(path, int(expires)), signature or "")
+
+def _expiry(ttl: Optional[int]) -> int:
+    return int(time.time()) + (ttl or settings.PLAYBACK_URL_TTL_SECONDS)
+
+def signed_url(origin: str, path: str, ttl: Optional[int] = None) -> dict:
+    expires = _expiry(ttl)
+    return {"playback_url": f"{origin}{path}?expires={expires}&sig={sign_path(path, expires)}", "expires": expires}
+
+def hls_scope(prefix: str, stream_key: str) -> str:
+    # What an HLS signature covers: the stream's playlist and every one of its segments
+    return f"{prefix}/{quote(stream_key, safe='')}"
+
+def signed_hls_url(origin: str, prefix: str, stream_key: str, ttl: Optional[int] = None) -> dict:
+    """The token goes in the path, {prefix}/{expires}/{sig}/{key}.m3u8, so the
+    relative segment URIs in the playlist resolve to URLs that carry it too."""
+    expires = _expiry(ttl)
+    signature = sign_path(hls_scope(prefix, stream_key), expires)
+    return {
+        "playback_url": f"{origin}{prefix}/{expires}/{signature}/{quote(stream_key, safe='')}.m3u8",
+        "expires": expires,
+    }
+
+def verify_hls_path(path: str) -> bool:
+    parts = path.rsplit("/", 3)
+    if len(parts) != 4:
+        return False
+    prefix, expires, signature, name = parts
+    match = HLS_FILE.fullmatch(name)
+    if not match:
+        return False
+    return verify_signed_path(f"{prefix}/{match['key']}", expires, signature)
+
+def _resolve(db: Session, cache_key: str, id_column, value_column, ids: Iterable[int]) -> Dict[int, str]:
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        return {}
+    try:
+        cached = redis_client.hmget(cache_key, ids)
+    except redis.RedisError:
+        cached = [None] * len(ids)
+    found = {id: value for id, value in zip(ids, cached) if value is not None}
+    missing = [id for id in ids if id not in found]
+    metrics.incr("playback.path_cache_hits", len(found))
+    if missing:
+        metrics.incr("playback.path_cache_misses", len(missing))
+        rows = db.query(id_column, value_column).filter(id_column.in_(missing)).all()
+        loaded = {row[0]: row[1] for row in rows}
+        if loaded:
+            try:
+                redis_client.hset(cache_key, mapping=loaded)
+            except redis.RedisError:
+                pass
+        found.update(loaded)
+    return found
+
+def resolve_stream_keys(db: Session, stream_ids: Iterable[int]) -> Dict[int, str]:
+    return _resolve(db, STREAM_PATHS_KEY, Stream.id, Stream.stream_key, stream_ids)
+
+def resolve_vod_files(db: Session, vod_ids: Iterable[int]) -> Dict[int, str]:
+    return _resolve(db, VOD_PATHS_KEY, VOD.id, VOD.file_path, vod_ids)
+
+def forget_stream_path(stream_id: int):
+    try:
+        redis_client.hdel(STREAM_PATHS_KEY, stream_id)
+    except redis.RedisError:
+        metrics.incr("playback.path_cache_errors")
+
+def forget_vod_path(vod_id: int):
+    try:
+        redis_client.hdel(VOD_PATHS_KEY, vod_id)
+    except redis.RedisError:
+        metrics.incr("playback.path_cache_errors")
+
+def recording_path(prefix: str, file_path: str) -> str:
+    return f"{prefix}/{quote(file_path)}"
@@ -0,0 +1,169 @@
+from typing import Dict, Iterable, NamedTuple, Set
+from app.core.config import get_settings
+from app.core.redis import redis_client, async_redis_client
+from app.core import metrics
+import asyncio
+import redis
+import os
+import socket
+import time
+import uuid
+
+settings = get_settings()
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+# zset of worker id -> last heartbeat; workers that stop beating drop out of every count
+WORKERS_KEY = "presence:workers"
+
+# Drop the fields of workers that stopped beating, e.g. after a crash or restart
+PRUNE_SOCKETS_SCRIPT = """
+local removed = 0
+for _, worker in ipairs(redis.call('hkeys', KEYS[1])) do
+    local beat = redis.call('zscore', KEYS[2], worker)
+    if not beat or tonumber(beat) < tonumber(ARGV[1]) then
+        redis.call('hdel', KEYS[1], worker)
+        removed = removed + 1
+    end
+end
+return removed
+"""
+
+_prune_sockets = async_redis_client.register_script(PRUNE_SOCKETS_SCRIPT)
+
+def sockets_key(stream_id: int) -> str:
+    # hash of worker id -> open chat sockets on that worker
+    return f"presence:stream:{stream_id}:sockets"
+
+def viewers_key(stream_id: int) -> str:
+    return f"presence:stream:{stream_id}:viewers"
+
+def chatters_key(stream_id: int) -> str:
+    return f"presence:stream:{stream_id}:chatters"
+
+class StreamPresence(NamedTuple):
+    sockets: int = 0
+    unique_viewers: int = 0
+    unique_chatters: int = 0
+
+class PresenceTracker:
+    """Keeps this worker's share of per-stream presence up to date in Redis.
+
+    Socket counts are adjusted on every connect/disconnect and rewritten with
+    each heartbeat, so a lost update heals itself. The heartbeat also prunes
+    fields left by dead workers and keeps the hash expiring, so a stream no
+    live worker serves any more drops out entirely. Unique viewers and
+    chatters go into HyperLogLogs.
+    """
+
+    def __init__(self):
+        self.local: Dict[int, int] = {}
+        self.chatters: Dict[int, Set[int]] = {}
+        self._task = None
+
+    async def connect(self, stream_id: int, user_id: int):
+        self.local[stream_id] = self.local.get(stream_id, 0) + 1
+        pipe = async_redis_client.pipeline(transaction=False)
+        pipe.hincrby(sockets_key(stream_id), WORKER_ID, 1)
+        pipe.expire(sockets_key(stream_id), int(settings.PRESENCE_WORKER_TTL_SECONDS))
+        pipe.pfadd(viewers_key(stream_id), user_id)
+        pipe.expire(viewers_key(stream_id), settings.PRESENCE_UNIQUES_TTL_SECONDS)
+        await self._execute(pipe)
+
+    async def disconnect(self, stream_id: int):
+        count = self.local.get(stream_id, 0) - 1
+        pipe = async_redis_client.pipeline(transaction=False)
+        if count > 0:
+            self.local[stream_id] = count
+            pipe.hincrby(sockets_key(stream_id), WORKER_ID, -1)
+        else:
+            self.local.pop(stream_id, None)
+            self.chatters.pop(stream_id, None)
+            pipe.hdel(sockets_key(stream_id), WORKER_ID)
+        await self._execute(pipe)
+
+    async def chatted(self, stream_id: int, user_id: int):
+        # Only a user's first message on this worker costs a Redis call
+        seen = self.chatters.setdefault(stream_id, set())
+        if user_id in seen:
+            return
+        seen.add(user_id)
+        pipe = async_redis_client.pipeline(transaction=False)
+        pipe.pfadd(chatters_key(stream_id), user_id)
+        pipe.expire(chatters_key(stream_id), settings.PRESENCE_UNIQUES_TTL_SECONDS)
+        if not await self._execute(pipe):
+            # Counted on their next message instead
+            seen.discard(user_id)
+
+    async def _execute(self, pipe) -> bool:
+        # Presence is best-effort: a Redis error never fails the socket, and
+        # the next heartbeat rewrites this worker's socket counts anyway
+        try:
+            await pipe.execute()
+            return True
+        except redis.RedisError:
+            metrics.incr("presence.write_errors")
+            return False
+
+    def start(self):
+        self._task = asyncio.create_task(self._heartbeat())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        pipe = async_redis_client.pipeline(transaction=False)
+        pipe.zrem(WORKERS_KEY, WORKER_ID)
+        for stream_id in self.local:
+            pipe.hdel(sockets_key(stream_id), WORKER_ID)
+        # Shutdown goes on without Redis; the other workers prune this one's fields
+        await self._execute(pipe)
+
+    async def _heartbeat(self):
+        while True:
+            try:
+                await self.beat()
+            except Exception:
+                metrics.incr("presence.heartbeat_errors")
+            await asyncio.sleep(settings.PRESENCE_HEARTBEAT_SECONDS)
+
+    async def beat(self):
+        now = time.time()
+        cutoff = now - settings.PRESENCE_WORKER_TTL_SECONDS
+        pipe = async_redis_client.pipeline(transaction=False)
+        pipe.zadd(WORKERS_KEY, {WORKER_ID: now})
+        pipe.zremrangebyscore(WORKERS_KEY, "-inf", cutoff)
+        for stream_id, count in self.local.items():
+            key = sockets_key(stream_id)
+            pipe.hset(key, WORKER_ID, count)
+            pipe.expire(key, int(settings.PRESENCE_WORKER_TTL_SECONDS))
+            await _prune_sockets(keys=[key, WORKERS_KEY], args=[cutoff], client=pipe)
+        await pipe.execute()
+
+def get_presence(stream_ids: Iterable[int]) -> Dict[int, StreamPresence]:
+    """Aggregate presence for several streams across live workers in one round trip.
+
+    Returns an empty dict when Redis is unavailable.
+    """
+    stream_ids = list(stream_ids)
+    if not stream_ids:
+        return {}
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.zrangebyscore(WORKERS_KEY, time.time() - settings.PRESENCE_WORKER_TTL_SECONDS, "+inf")
+    for stream_id in stream_ids:
+        pipe.hgetall(sockets_key(stream_id))
+        pipe.pfcount(viewers_key(stream_id))
+        pipe.pfcount(chatters_key(stream_id))
+    try:
+        results = pipe.execute()
+    except redis.RedisError:
+        metrics.incr("presence.read_errors")
+        return {}
+    alive = set(results[0])
+    presence = {}
+    for index, stream_id in enumerate(stream_ids):
+        counts, viewers, chatters = results[1 + index * 3: 4 + index * 3]
+        sockets = sum(int(count) for worker, count in counts.items() if worker in alive)
+        presence[stream_id] = StreamPresence(max(sockets, 0), viewers, chatters)
+    return presence
+
+presence_tracker = PresenceTracker()
@@ -0,0 +1,96 @@
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+from app.models import User
+from app.core.config import get_settings
+from app.core.redis import redis_client, async_redis_client
+from app.core.pubsub import pubsub_hub
+from app.core import metrics
+import redis
+import threading
+import time
+
+settings = get_settings()
+
+# Carries the email of a user whose cached principals every worker must drop
+INVALIDATIONS_CHANNEL = "principals:invalidate"
+
+class PrincipalCache:
+    """Bounded TTL + LRU cache of authenticated users keyed by access token.
+
+    Cached users are detached copies, safe to share between requests. Call
+    invalidate_principal() whenever a user's role, status or email changes;
+    it reaches every worker through Redis pub/sub. Only while that is down
+    can a stale entry outlive the change, for at most the TTL.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, User]]" = OrderedDict()
+        self._tokens_by_email: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, token: str) -> Optional[User]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(token)
+                metrics.incr("auth.principal_cache_hits")
+                return entry[1]
+            if entry:
+                self._remove(token)
+        metrics.incr("auth.principal_cache_misses")
+        return None
+
+    def put(self, token: str, user: User) -> User:
+        principal = User(**{column.key: getattr(user, column.key) for column in User.__table__.columns})
+        with self._lock:
+            if token in self._entries:
+                self._remove(token)
+            self._entries[token] = (time.monotonic() + self.ttl, principal)
+            self._tokens_by_email.setdefault(principal.email, set()).add(token)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+        return principal
+
+    def invalidate(self, email: str):
+        with self._lock:
+            for token in list(self._tokens_by_email.get(email, ())):
+                self._remove(token)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_email.clear()
+
+    def _remove(self, token: str):
+        _, principal = self._entries.pop(token)
+        tokens = self._tokens_by_email.get(principal.email)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_email[principal.email]
+
+principal_cache = PrincipalCache(settings.PRINCIPAL_CACHE_SIZE, settings.PRINCIPAL_CACHE_TTL_SECONDS)
+metrics.register_gauge("auth.principal_cache_size", lambda: len(principal_cache))
+
+def invalidate_principal(email: str):
+    principal_cache.invalidate(email)
+    try:
+        redis_client.publish(INVALIDATIONS_CHANNEL, email)
+    except redis.RedisError:
+        metrics.incr("auth.principal_invalidation_errors")
+
+async def invalidate_principal_async(email: str):
+    principal_cache.invalidate(email)
+    try:
+        await async_redis_client.publish(INVALIDATIONS_CHANNEL, email)
+    except redis.RedisError:
+        metrics.incr("auth.principal_invalidation_errors")
+
+async def subscribe_invalidations():
+    # Invalidations published while disconnected are lost, so a reconnect drops everything
+    await pubsub_hub.subscribe(INVALIDATIONS_CHANNEL, principal_cache.invalidate, on_reconnect=principal_cache.clear)
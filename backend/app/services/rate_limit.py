@@ -0,0 +1,73 @@
+from typing import NamedTuple, Optional
+from app.core.config import get_settings
+from app.core.redis import async_redis_client
+from app.core import metrics
+
+settings = get_settings()
+
+ALLOWED = 0
+THROTTLED_USER = 1
+THROTTLED_STREAM = 2
+
+# Refills and takes one token from both the per-user and the per-stream bucket
+# in a single atomic step, using the Redis clock so every worker agrees.
+# KEYS: user bucket, stream bucket; ARGV: user rate, user burst, stream rate, stream burst
+TOKEN_BUCKET_SCRIPT = """
+local now = redis.call('TIME')
+local now_ms = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+
+local function refill(key, rate, burst)
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or burst
+    local ts = tonumber(bucket[2]) or now_ms
+    return math.min(burst, tokens + math.max(0, now_ms - ts) * rate / 1000)
+end
+
+local function store(key, tokens, rate, burst)
+    redis.call('HSET', key, 'tokens', tokens, 'ts', now_ms)
+    redis.call('PEXPIRE', key, math.ceil(burst / rate * 1000) + 1000)
+end
+
+local user_rate, user_burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local stream_rate, stream_burst = tonumber(ARGV[3]), tonumber(ARGV[4])
+local user_tokens = refill(KEYS[1], user_rate, user_burst)
+local stream_tokens = refill(KEYS[2], stream_rate, stream_burst)
+
+local result = 0
+if user_tokens < 1 then
+    result = 1
+elseif stream_tokens < 1 then
+    result = 2
+else
+    user_tokens = user_tokens - 1
+    stream_tokens = stream_tokens - 1
+end
+store(KEYS[1], user_tokens, user_rate, user_burst)
+store(KEYS[2], stream_tokens, stream_rate, stream_burst)
+return result
+"""
+
+_token_bucket = async_redis_client.register_script(TOKEN_BUCKET_SCRIPT)
+
+class ChatRateLimit(NamedTuple):
+    user_rate: float
+    stream_rate: float
+
+def chat_rate_limit(user_rate: Optional[float] = None, stream_rate: Optional[float] = None) -> ChatRateLimit:
+    return ChatRateLimit(user_rate or settings.CHAT_USER_RATE, stream_rate or settings.CHAT_STREAM_RATE)
+
+async def allow_chat_message(stream_id: int, user_id: int, limit: ChatRateLimit) -> bool:
+    # The hash tag keeps both buckets of a stream in the same cluster slot
+    keys = [f"chat:ratelimit:{{{stream_id}}}:user:{user_id}", f"chat:ratelimit:{{{stream_id}}}"]
+    args = [limit.user_rate, settings.CHAT_USER_BURST, limit.stream_rate, settings.CHAT_STREAM_BURST]
+    try:
+        result = await _token_bucket(keys=keys, args=args)
+    except Exception:
+        # Fail open: losing the limiter must not take chat down with it
+        metrics.incr("chat.rate_limit_errors")
+        return True
+    if result == THROTTLED_USER:
+        metrics.incr("chat.throttled_user")
+    elif result == THROTTLED_STREAM:
+        metrics.incr("chat.throttled_stream")
+    return result == ALLOWED
@@ -0,0 +1,238 @@
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional, Tuple
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+from app.core.config import get_settings
+from app.core import metrics
+from app.services.response_cache import etag_matches
+import asyncio
+import mimetypes
+import os
+import threading
+import time
+
+settings = get_settings()
+
+CHUNK_SIZE = 256 * 1024
+
+mimetypes.add_type("video/x-flv", ".flv")
+
+class RecordingNotFound(Exception):
+    pass
+
+class RecordingStorageUnavailable(Exception):
+    pass
+
+class OpenRecording:
+    """An open recording with the metadata needed to answer conditional and
+    range requests. The file closes once nothing references it, so evicting
+    an entry never cuts off a response in flight."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "rb")
+        stat = os.fstat(self.file.fileno())
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+        self.mtime_ns = stat.st_mtime_ns
+        self.etag = f'"{self.size:x}-{self.mtime_ns:x}"'
+        self.last_modified = formatdate(self.mtime, usegmt=True)
+        self.media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self.checked_at = time.monotonic()
+
+    def is_current(self) -> bool:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        return stat.st_size == self.size and stat.st_mtime_ns == self.mtime_ns
+
+class RecordingCache:
+    """LRU of open recordings keyed by path; entries are re-stat'ed after
+    VOD_FILE_CACHE_TTL_SECONDS so replaced files are picked up."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, OpenRecording]" = OrderedDict()
+        self._lock = threading.Lock()
+        metrics.register_gauge("recordings.open_files", lambda: len(self._entries))
+
+    def open(self, path: str) -> OpenRecording:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry and now - entry.checked_at < self.ttl:
+                self._entries.move_to_end(path)
+                metrics.incr("recordings.cache_hits")
+                return entry
+        if entry and entry.is_current():
+            entry.checked_at = now
+            metrics.incr("recordings.cache_hits")
+            return entry
+        metrics.incr("recordings.cache_misses")
+        try:
+            entry = OpenRecording(path)
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+            with self._lock:
+                self._entries.pop(path, None)
+            raise RecordingNotFound(path)
+        with self._lock:
+            self._entries[path] = entry
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return entry
+
+def recordings_root() -> str:
+    if not settings.VOD_STORAGE_ROOT:
+        raise RecordingStorageUnavailable()
+    return os.path.realpath(settings.VOD_STORAGE_ROOT)
+
+def resolve_recording(file_path: str) -> str:
+    """Absolute path of a recording, which must lie strictly under
+    VOD_STORAGE_ROOT. Relative paths are taken from the root; absolute ones,
+    as nginx-rtmp reports them, must already point inside it. Rows stored
+    before paths were made relative hold the absolute path minus its leading
+    "/"; those are recognised by the root as their prefix and taken as absolute."""
+    root = recordings_root()
+    for prefix in {root, os.path.normpath(settings.VOD_STORAGE_ROOT)}:
+        if file_path.startswith(prefix.lstrip("/") + "/"):
+            file_path = "/" + file_path
+            break
+    # realpath collapses "..", "." and symlinks before the containment check
+    path = os.path.realpath(os.path.join(root, file_path))
+    if path == root or os.path.commonpath([root, path]) != root:
+        raise RecordingNotFound(file_path)
+    return path
+
+def relative_recording_path(file_path: str) -> str:
+    return os.path.relpath(resolve_recording(file_path), recordings_root())
+
+def _not_modified(headers, recording: OpenRecording) -> bool:
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, recording.etag)
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(recording.mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Returns (start, end) inclusive for a single satisfiable byte range,
+    None to serve the whole file, and raises ValueError if unsatisfiable."""
+    if not header or not header.startswith("bytes=") or "," in header:
+        # Multipart ranges are not worth it for media; the full body is a valid answer
+        return None
+    first, _, last = header[6:].strip().partition("-")
+    try:
+        start = int(first) if first else None
+        end = int(last) if last else None
+    except ValueError:
+        return None
+    if start is None:
+        if end is None:
+            return None
+        # Suffix range: the last `end` bytes, of which an empty file has none
+        if end <= 0 or size == 0:
+            raise ValueError(header)
+        return max(size - end, 0), size - 1
+    if end is not None and end < start:
+        # Syntactically invalid, so the header is ignored (RFC 9110 14.1.1)
+        return None
+    if start >= size:
+        raise ValueError(header)
+    if end is None:
+        end = size - 1
+    return start, min(end, size - 1)
+
+class RecordingResponse(Response):
+    """ASGI response for a recording.
+
+    When the server offers the zerocopysend extension the kernel copies the
+    bytes straight from the file (sendfile); whole-file responses can also
+    go through pathsend. uvicorn offers neither, so the usual path reads the
+    file with pread in the default executor, one chunk ahead of the send, so
+    disk waits never block the event loop.
+    """
+
+    def __init__(self, recording: OpenRecording, request_headers, method: str):
+        self.recording = recording
+        self.method = method
+        self.background = None
+        self.status_code = 200
+        self.start, self.length = 0, recording.size
+        self.raw_headers = []
+        self.headers.update({
+            "accept-ranges": "bytes",
+            "etag": recording.etag,
+            "last-modified": recording.last_modified,
+            "cache-control": "private, max-age=0, must-revalidate",
+        })
+        if _not_modified(request_headers, recording):
+            self.status_code, self.length = 304, 0
+            return
+        self.headers["content-type"] = recording.media_type
+        range_header = request_headers.get("range")
+        if_range = request_headers.get("if-range")
+        if if_range and if_range.strip() not in (recording.etag, recording.last_modified):
+            range_header = None
+        try:
+            byte_range = parse_range(range_header, recording.size)
+        except ValueError:
+            self.status_code, self.length = 416, 0
+            self.headers["content-range"] = f"bytes */{recording.size}"
+            return
+        if byte_range:
+            start, end = byte_range
+            self.status_code, self.start, self.length = 206, start, end - start + 1
+            self.headers["content-range"] = f"bytes {start}-{end}/{recording.size}"
+        self.headers["content-length"] = str(self.length)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+        if self.method == "HEAD" or not self.length:
+            await send({"type": "http.response.body", "body": b""})
+            return
+        extensions = scope.get("extensions") or {}
+        if "http.response.zerocopysend" in extensions:
+            metrics.incr("recordings.zerocopy_responses")
+            await send({
+                "type": "http.response.zerocopysend",
+                "file": self.recording.file.fileno(),
+                "offset": self.start,
+                "count": self.length,
+            })
+            return
+        if "http.response.pathsend" in extensions and self.status_code == 200:
+            metrics.incr("recordings.pathsend_responses")
+            await send({"type": "http.response.pathsend", "path": self.recording.path})
+            return
+        loop = asyncio.get_running_loop()
+        fd = self.recording.file.fileno()
+        offset, end = self.start, self.start + self.length
+
+        def read_next():
+            return loop.run_in_executor(None, os.pread, fd, min(CHUNK_SIZE, end - offset), offset)
+
+        pending = read_next()
+        while offset < end:
+            chunk = await pending
+            if not chunk:
+                # Truncated under us; the content-length already promised more, so the response is cut short
+                raise EOFError(self.recording.path)
+            offset += len(chunk)
+            if offset < end:
+                pending = read_next()
+            await send({"type": "http.response.body", "body": chunk, "more_body": offset < end})
+        metrics.incr("recordings.bytes_sent", self.length)
+
+recording_cache = RecordingCache(settings.VOD_FILE_CACHE_SIZE, settings.VOD_FILE_CACHE_TTL_SECONDS)
@@ -0,0 +1,89 @@
+from typing import Callable, Optional
+from urllib.parse import urlencode
+from fastapi import Request
+from fastapi.responses import Response
+from app.core.config import get_settings
+from app.core.redis import redis_client, async_redis_client
+from app.core import metrics
+import hashlib
+import orjson
+import redis
+import time
+
+settings = get_settings()
+
+CACHE_PREFIX = "respcache:"
+CACHED_HEADERS = ("x-next-cursor",)
+
+# Namespaces group the cached variants of related routes so a write can drop
+# them all with one DEL:
+#   stream:<id>  get_stream
+#   streams      list_streams
+#   vods         list_vods
+
+def stream_namespace(stream_id: int) -> str:
+    return f"stream:{stream_id}"
+
+def _variant(request: Request) -> str:
+    return request.url.path + "?" + urlencode(sorted(request.query_params.multi_items()))
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+def etag_matches(header: str, etag: str) -> bool:
+    # If-None-Match uses the weak comparison, token by token; "*" matches anything
+    return any(candidate.strip().removeprefix("W/") in (etag, "*") for candidate in header.split(","))
+
+def _respond(request: Request, etag: str, body: bytes, headers: dict) -> Response:
+    headers = {**headers, "ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+def cached_response(request: Request, namespace: str, build: Callable[[], Response]) -> Response:
+    """Serve a JSON GET from the Redis response cache, building it on a miss.
+
+    Every response carries a strong ETag, and a matching If-None-Match gets a
+    bodiless 304, whether or not the entry was cached.
+    """
+    key, variant = CACHE_PREFIX + namespace, _variant(request)
+    try:
+        packed: Optional[str] = redis_client.hget(key, variant)
+    except redis.RedisError:
+        packed = None
+    if packed:
+        expires, etag, headers, body = packed.split("\n", 3)
+        if float(expires) > time.time():
+            metrics.incr("response_cache.hits")
+            return _respond(request, etag, body.encode(), orjson.loads(headers))
+    metrics.incr("response_cache.misses")
+    response = build()
+    headers = {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers}
+    body = response.body
+    etag = _etag(body)
+    if response.status_code == 200:
+        expires = time.time() + settings.RESPONSE_CACHE_TTL_SECONDS
+        packed = f"{expires}\n{etag}\n{orjson.dumps(headers).decode()}\n{body.decode()}"
+        try:
+            pipe = redis_client.pipeline()
+            pipe.hset(key, variant, packed)
+            pipe.expire(key, int(settings.RESPONSE_CACHE_TTL_SECONDS) + 1)
+            pipe.execute()
+        except redis.RedisError:
+            pass
+    return _respond(request, etag, body, headers)
+
+# Invalidation failures are counted rather than raised: the write has already
+# been committed, and stale entries age out within RESPONSE_CACHE_TTL_SECONDS.
+
+def invalidate(*namespaces: str):
+    try:
+        redis_client.delete(*[CACHE_PREFIX + namespace for namespace in namespaces])
+    except redis.RedisError:
+        metrics.incr("response_cache.invalidation_errors")
+
+async def invalidate_async(*namespaces: str):
+    try:
+        await async_redis_client.delete(*[CACHE_PREFIX + namespace for namespace in namespaces])
+    except redis.RedisError:
+        metrics.incr("response_cache.invalidation_errors")
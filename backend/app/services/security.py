@@ -1,13 +1,61 @@
-from app.core.redis import redis_client
+from typing import NamedTuple
+from app.core.redis import async_redis_client
+from app.core import metrics
+from app.services.audit import audit_log
 from datetime import timedelta
 import re
-import logging
-
-logging.basicConfig(filename='auth_audit.log', level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+import redis
+import uuid
 
 MAX_FAILED_ATTEMPTS = 5
 LOCKOUT_TIME_SECONDS = 15 * 60  # 15 minutes
+# Failed logins from one address, across all emails, within a sliding window
+MAX_FAILED_ATTEMPTS_PER_IP = 50
+IP_WINDOW_SECONDS = 15 * 60
+
+# Each script is the whole check or record step in one round trip, using the
+# Redis clock so every worker agrees on the window.
+
+# KEYS: failed attempts, lockout, ip window; ARGV: ip limit, window ms
+# Returns {email locked, ip throttled, failed attempts so far}
+CHECK_LOGIN_SCRIPT = """
+local now = redis.call('TIME')
+local now_ms = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', now_ms - tonumber(ARGV[2]))
+local locked = redis.call('EXISTS', KEYS[2])
+local throttled = 0
+if redis.call('ZCARD', KEYS[3]) >= tonumber(ARGV[1]) then
+    throttled = 1
+end
+return {locked, throttled, tonumber(redis.call('GET', KEYS[1]) or '0')}
+"""
+
+# KEYS: failed attempts, lockout, ip window; ARGV: max attempts, lockout seconds, window ms, member
+# Returns the email's failed attempt count, 0 once it has been locked out
+RECORD_FAILURE_SCRIPT = """
+local now = redis.call('TIME')
+local now_ms = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+redis.call('ZADD', KEYS[3], now_ms, ARGV[4])
+redis.call('PEXPIRE', KEYS[3], ARGV[3])
+local attempts = redis.call('INCR', KEYS[1])
+if attempts == 1 then
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+if attempts >= tonumber(ARGV[1]) then
+    redis.call('SET', KEYS[2], 1, 'EX', ARGV[2])
+    redis.call('DEL', KEYS[1])
+    return 0
+end
+return attempts
+"""
 
+class LoginCheck(NamedTuple):
+    email_locked: bool = False
+    ip_throttled: bool = False
+    failed_attempts: int = 0
+
+_check_login = async_redis_client.register_script(CHECK_LOGIN_SCRIPT)
+_record_failure = async_redis_client.register_script(RECORD_FAILURE_SCRIPT)
 
 def get_failed_attempts_key(email: str) -> str:
     return f"failed_attempts:{email}"
@@ -15,22 +63,37 @@ def get_failed_attempts_key(email: str) -> str:
 def get_lockout_key(email: str) -> str:
     return f"lockout:{email}"
 
-def is_account_locked(email: str) -> bool:
-    return redis_client.exists(get_lockout_key(email)) == 1
+def get_ip_window_key(ip: str) -> str:
+    return f"failed_ips:{ip}"
+
+# Lockout is defence in depth: if Redis is unreachable, logins proceed on the password alone
+
+async def check_login(email: str, ip: str) -> LoginCheck:
+    try:
+        locked, throttled, attempts = await _check_login(
+            keys=[get_failed_attempts_key(email), get_lockout_key(email), get_ip_window_key(ip)],
+            args=[MAX_FAILED_ATTEMPTS_PER_IP, IP_WINDOW_SECONDS * 1000],
+        )
+    except redis.RedisError:
+        metrics.incr("auth.lockout_errors")
+        return LoginCheck()
+    return LoginCheck(bool(locked), bool(throttled), int(attempts))
 
-def increment_failed_attempts(email: str):
-    key = get_failed_attempts_key(email)
-    attempts = redis_client.incr(key)
-    if attempts == 1:
-        redis_client.expire(key, LOCKOUT_TIME_SECONDS)
-    if attempts >= MAX_FAILED_ATTEMPTS:
-        redis_client.set(get_lockout_key(email), 1, ex=LOCKOUT_TIME_SECONDS)
-        redis_client.delete(key)
-    return attempts
+async def record_failed_login(email: str, ip: str) -> int:
+    try:
+        return await _record_failure(
+            keys=[get_failed_attempts_key(email), get_lockout_key(email), get_ip_window_key(ip)],
+            args=[MAX_FAILED_ATTEMPTS, LOCKOUT_TIME_SECONDS, IP_WINDOW_SECONDS * 1000, uuid.uuid4().hex],
+        )
+    except redis.RedisError:
+        metrics.incr("auth.lockout_errors")
+        return 0
 
-def reset_failed_attempts(email: str):
-    redis_client.delete(get_failed_attempts_key(email))
-    redis_client.delete(get_lockout_key(email))
+async def reset_failed_attempts(email: str):
+    try:
+        await async_redis_client.delete(get_failed_attempts_key(email), get_lockout_key(email))
+    except redis.RedisError:
+        metrics.incr("auth.lockout_errors")
 
 def validate_password_complexity(password: str):
     if len(password) < 8:
@@ -45,4 +108,4 @@ def validate_password_complexity(password: str):
         raise ValueError("Password must contain at least one special character.")
 
 def log_auth_event(event_type: str, user: str, detail: str = ""):
-    logging.info(f"{event_type} | user={user} | {detail}") 
\ No newline at end of file
+    audit_log.record(event_type, user=user, detail=detail) 
\ No newline at end of file
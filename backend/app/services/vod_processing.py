@@ -0,0 +1,191 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Optional, Set
+from sqlalchemy import select, update
+from app.db.session import AsyncSessionLocal
+from app.models import VOD
+from app.core.config import get_settings
+from app.core.redis import async_redis_client
+from app.core import metrics
+from app.services import response_cache
+from app.services.media import MediaError, probe
+from app.services.recordings import RecordingNotFound, resolve_recording
+from app.services.presence import WORKER_ID
+import asyncio
+import multiprocessing
+import redis
+
+settings = get_settings()
+
+RECOVERY_BATCH_SIZE = 1000
+# Stored in VOD.format once a file can never be probed, which keeps it out of recovery
+UNPROCESSABLE_FORMAT = "unknown"
+
+def job_lock_key(vod_id: int) -> str:
+    return f"vod:processing:{vod_id}"
+
+class JobLocked(Exception):
+    pass
+
+class VODProcessor:
+    """Fills duration, size, format and bitrate for new recordings.
+
+    Header parsing runs in a process pool; at most VOD_PROCESS_CONCURRENCY
+    jobs are in flight per worker. A job only writes what it read from the
+    file, so running it twice is harmless, and a short Redis lock keeps
+    workers from doing the same one at once; a worker that finds it taken
+    checks back after VOD_PROCESS_RETRY_SECONDS, without spending an attempt,
+    until the holder has finished it or let go of it. Failures retry with
+    backoff up to VOD_PROCESS_MAX_ATTEMPTS. A file that is not parseable media or lies
+    outside the recordings root is marked format="unknown" at once, as is
+    one that ran out of attempts; anything else left unprocessed (format IS
+    NULL) is picked up again at startup.
+    """
+
+    def __init__(self, pool_size: int, concurrency: int, max_attempts: int, retry_delay: float):
+        self.pool_size = pool_size
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.queue: Optional[asyncio.Queue] = None
+        self.queued: Set[int] = set()
+        self.active = 0
+        self._pool = None
+        self._tasks = []
+        # vod id -> timer that puts it back on the queue
+        self._retries: Dict[int, asyncio.TimerHandle] = {}
+        metrics.register_gauge("vod.processing_queued", lambda: len(self.queued))
+        metrics.register_gauge("vod.processing_active", lambda: self.active)
+
+    def submit(self, vod_ids: Iterable[int]):
+        if self.queue is None:
+            return
+        for vod_id in vod_ids:
+            if vod_id not in self.queued:
+                self.queued.add(vod_id)
+                self.queue.put_nowait((vod_id, 1))
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        # spawn: forking a process that runs an event loop and DB pools is not safe
+        self._pool = ProcessPoolExecutor(self.pool_size, mp_context=multiprocessing.get_context("spawn"))
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._recover()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for handle in self._retries.values():
+            handle.cancel()
+        self._retries.clear()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = None
+        self.queue = None
+        self.queued.clear()
+
+    async def _recover(self):
+        last_id = 0
+        while True:
+            try:
+                async with AsyncSessionLocal() as db:
+                    ids = list((await db.execute(
+                        select(VOD.id).where(VOD.format.is_(None), VOD.id > last_id).order_by(VOD.id).limit(RECOVERY_BATCH_SIZE)
+                    )).scalars())
+            except Exception:
+                metrics.incr("vod.recovery_failures")
+                return
+            if not ids:
+                return
+            metrics.incr("vod.recovered", len(ids))
+            self.submit(ids)
+            last_id = ids[-1]
+
+    async def _work(self):
+        while True:
+            vod_id, attempt = await self.queue.get()
+            self.active += 1
+            try:
+                done = await self._process(vod_id)
+            except JobLocked:
+                metrics.incr("vod.processing_deferred")
+                self._retry_later(vod_id, attempt, self.retry_delay)
+                continue
+            except Exception:
+                done = False
+            finally:
+                self.active -= 1
+            if done:
+                self.queued.discard(vod_id)
+            elif attempt >= self.max_attempts:
+                metrics.incr("vod.processing_gave_up")
+                await self._mark_unprocessable(vod_id)
+                self.queued.discard(vod_id)
+            else:
+                metrics.incr("vod.processing_retries")
+                self._retry_later(vod_id, attempt + 1, self.retry_delay * 2 ** (attempt - 1))
+
+    def _retry_later(self, vod_id: int, attempt: int, delay: float):
+        # Kept so stop() can cancel them: none may fire into a queue that is gone
+        self._retries[vod_id] = asyncio.get_running_loop().call_later(delay, self._retry, vod_id, attempt)
+
+    def _retry(self, vod_id: int, attempt: int):
+        del self._retries[vod_id]
+        self.queue.put_nowait((vod_id, attempt))
+
+    async def _process(self, vod_id: int) -> bool:
+        try:
+            locked = await async_redis_client.set(job_lock_key(vod_id), WORKER_ID, nx=True, ex=settings.VOD_PROCESS_LOCK_SECONDS)
+        except redis.RedisError:
+            locked = True
+        if not locked:
+            raise JobLocked(vod_id)
+        try:
+            async with AsyncSessionLocal() as db:
+                row = (await db.execute(select(VOD.file_path, VOD.format).where(VOD.id == vod_id))).first()
+                if row is None or row.format is not None:
+                    return True
+                loop = asyncio.get_running_loop()
+                try:
+                    info = await loop.run_in_executor(self._pool, probe, resolve_recording(row.file_path))
+                except (MediaError, RecordingNotFound):
+                    # Retrying cannot change the outcome
+                    metrics.incr("vod.processing_failures")
+                    await self._mark_unprocessable(vod_id)
+                    return True
+                except Exception:
+                    metrics.incr("vod.processing_failures")
+                    return False
+                await db.execute(
+                    update(VOD).where(VOD.id == vod_id).values(
+                        duration=round(info.duration) if info.duration is not None else None,
+                        size_bytes=info.size_bytes, format=info.format, bitrate=info.bitrate,
+                    )
+                )
+                await db.commit()
+        finally:
+            try:
+                await async_redis_client.delete(job_lock_key(vod_id))
+            except redis.RedisError:
+                pass
+        metrics.incr("vod.processed")
+        await response_cache.invalidate_async("vods")
+        return True
+
+    async def _mark_unprocessable(self, vod_id: int):
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(VOD).where(VOD.id == vod_id, VOD.format.is_(None)).values(format=UNPROCESSABLE_FORMAT)
+                )
+                await db.commit()
+        except Exception:
+            # Left NULL, so the next startup's recovery tries it again
+            metrics.incr("vod.mark_unprocessable_failures")
+            return
+        metrics.incr("vod.unprocessable")
+
+vod_processor = VODProcessor(
+    settings.VOD_PROCESS_POOL_SIZE, settings.VOD_PROCESS_CONCURRENCY,
+    settings.VOD_PROCESS_MAX_ATTEMPTS, settings.VOD_PROCESS_RETRY_SECONDS,
+)
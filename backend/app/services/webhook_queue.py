@@ -0,0 +1,300 @@
+from datetime import datetime
+from typing import Dict, List, Mapping, Optional, Set, Tuple
+from sqlalchemy import select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import InterfaceError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.session import AsyncSessionLocal
+from app.models import Stream, StreamStatus, VOD
+from app.core.config import get_settings
+from app.core.redis import async_redis_client
+from app.core import metrics
+from app.services import response_cache
+from app.services.response_cache import stream_namespace
+from app.services.presence import WORKER_ID
+from app.services.webhooks import forget_stream_key_async
+from app.services.vod_processing import vod_processor
+import asyncio
+import redis
+import zlib
+
+settings = get_settings()
+
+GROUP = "appliers"
+DEAD_LETTER_KEY = "webhooks:dead"
+# hash of entry id -> failed apply attempts
+ATTEMPTS_KEY = "webhooks:attempts"
+
+# The database being unreachable is not the event's fault: retry without counting an attempt
+TRANSIENT_ERRORS = (OperationalError, InterfaceError, OSError, asyncio.TimeoutError)
+
+# Take or extend a partition lease, but only if nobody else holds it
+LEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+if redis.call('set', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then
+    return 1
+end
+return 0
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+Event = Tuple[Optional[str], Mapping[str, str]]
+
+def partition_key(stream_key: str) -> str:
+    # Every event for a stream key lands in the same partition, which one worker owns at a time
+    return f"webhooks:{zlib.crc32(stream_key.encode()) % settings.WEBHOOK_QUEUE_PARTITIONS}"
+
+def lease_key(partition: str) -> str:
+    return f"{partition}:lease"
+
+async def enqueue_webhook(event: Mapping[str, str]) -> bool:
+    try:
+        await async_redis_client.xadd(
+            partition_key(event["stream_key"]), event,
+            maxlen=settings.WEBHOOK_QUEUE_MAXLEN, approximate=True,
+        )
+    except redis.RedisError:
+        metrics.incr("webhooks.enqueue_failures")
+        return False
+    metrics.incr("webhooks.enqueued")
+    return True
+
+def _received_at(entry_id: Optional[str]) -> datetime:
+    # The entry id carries the append time, so a redelivered recording keeps its original timestamp
+    if entry_id is None:
+        return datetime.utcnow()
+    return datetime.utcfromtimestamp(int(entry_id.split("-")[0]) / 1000)
+
+async def apply_webhook_events(db: AsyncSession, events: List[Event]):
+    """Apply events in one transaction: the last status per stream wins,
+    recordings insert idempotently on (stream_id, file_path)."""
+    statuses: Dict[int, Tuple[str, str]] = {}
+    recordings: Dict[Tuple[int, str], dict] = {}
+    for entry_id, event in events:
+        stream_id = int(event["stream_id"])
+        if event["type"] == "status":
+            statuses[stream_id] = (event["stream_key"], event["status"])
+        else:
+            recordings.setdefault((stream_id, event["file_path"]), {
+                "stream_id": stream_id, "file_path": event["file_path"],
+                "created_at": _received_at(entry_id), "is_public": True,
+                "stream_key": event["stream_key"],
+            })
+    metrics.incr("webhooks.coalesced", len(events) - len(statuses) - len(recordings))
+
+    by_status: Dict[str, list] = {}
+    for stream_id, (stream_key, new_status) in statuses.items():
+        by_status.setdefault(new_status, []).append((stream_id, stream_key))
+    stale_keys: Set[str] = set()
+    created: List[int] = []
+    updated: List[int] = []
+    for new_status, pairs in by_status.items():
+        # Matching on the key as well guards against a cache entry that outlived a rotation
+        result = await db.execute(
+            update(Stream)
+            .where(tuple_(Stream.id, Stream.stream_key).in_(pairs))
+            .values(status=StreamStatus(new_status))
+            .returning(Stream.id)
+        )
+        matched = set(result.scalars())
+        updated.extend(matched)
+        stale_keys.update(stream_key for stream_id, stream_key in pairs if stream_id not in matched)
+
+    if recordings:
+        existing = set((await db.execute(
+            select(Stream.id).where(Stream.id.in_({stream_id for stream_id, _ in recordings}))
+        )).scalars())
+        rows = []
+        for row in recordings.values():
+            stream_key = row.pop("stream_key")
+            if row["stream_id"] in existing:
+                rows.append(row)
+            else:
+                stale_keys.add(stream_key)
+        if rows:
+            result = await db.execute(
+                insert(VOD).on_conflict_do_nothing(index_elements=["stream_id", "file_path"]).returning(VOD.id), rows
+            )
+            created = list(result.scalars())
+    await db.commit()
+    if created:
+        vod_processor.submit(created)
+
+    for stream_key in stale_keys:
+        await forget_stream_key_async(stream_key)
+    namespaces = [stream_namespace(stream_id) for stream_id in updated]
+    if updated:
+        namespaces.append("streams")
+    if recordings:
+        namespaces.append("vods")
+    if namespaces:
+        await response_cache.invalidate_async(*namespaces)
+    metrics.incr("webhooks.applied", len(events))
+
+class WebhookApplier:
+    """Consumes the webhook partitions this worker holds a lease on.
+
+    Each partition is owned by one worker at a time, so events for a stream
+    key are applied in append order. A worker taking over a partition claims
+    the previous owner's unacknowledged entries first. Events that keep
+    failing are moved to the dead-letter stream after WEBHOOK_MAX_ATTEMPTS.
+    If a lease lapses mid-batch the next owner may apply some events again,
+    which the idempotent writes absorb.
+    """
+
+    def __init__(self, partitions: int, batch_size: int, block_ms: int, lease_ms: int, max_attempts: int):
+        self.partitions = [f"webhooks:{n}" for n in range(partitions)]
+        self.batch_size = batch_size
+        self.block_ms = block_ms
+        self.lease_ms = lease_ms
+        self.max_attempts = max_attempts
+        self.owned: Set[str] = set()
+        self.retry: Set[str] = set()
+        self._renewed_at = 0.0
+        self._closing = False
+        self._task = None
+        self._lease = async_redis_client.register_script(LEASE_SCRIPT)
+        self._release = async_redis_client.register_script(RELEASE_SCRIPT)
+        metrics.register_gauge("webhooks.owned_partitions", lambda: len(self.owned))
+
+    def start(self):
+        self._closing = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._closing = True
+        if self._task:
+            await self._task
+            self._task = None
+        for partition in self.owned:
+            try:
+                await self._release(keys=[lease_key(partition)], args=[WORKER_ID])
+            except redis.RedisError:
+                pass
+        self.owned.clear()
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await self._renew_leases()
+                if not self.owned:
+                    await asyncio.sleep(self.lease_ms / 3000)
+                    continue
+                if not await self._consume():
+                    await asyncio.sleep(self.block_ms / 1000)
+            except redis.RedisError:
+                metrics.incr("webhooks.consumer_errors")
+                await asyncio.sleep(self.block_ms / 1000)
+
+    async def _renew_leases(self):
+        now = asyncio.get_running_loop().time()
+        if now - self._renewed_at < self.lease_ms / 3000:
+            return
+        self._renewed_at = now
+        for partition in self.partitions:
+            held = await self._lease(keys=[lease_key(partition)], args=[WORKER_ID, self.lease_ms])
+            if held and partition not in self.owned:
+                await self._take_over(partition)
+                self.owned.add(partition)
+            elif not held:
+                self.owned.discard(partition)
+                self.retry.discard(partition)
+
+    async def _take_over(self, partition: str):
+        try:
+            await async_redis_client.xgroup_create(partition, GROUP, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        start = "0-0"
+        while True:
+            start, claimed, *_ = await async_redis_client.xautoclaim(
+                partition, GROUP, WORKER_ID, min_idle_time=0, start_id=start, count=self.batch_size
+            )
+            if claimed:
+                metrics.incr("webhooks.claimed", len(claimed))
+            if start == "0-0":
+                break
+        # Read back this consumer's pending entries before taking new ones
+        self.retry.add(partition)
+
+    async def _consume(self) -> bool:
+        streams = {partition: "0" if partition in self.retry else ">" for partition in self.owned}
+        block = None if self.retry else self.block_ms
+        response = await async_redis_client.xreadgroup(
+            GROUP, WORKER_ID, streams, count=self.batch_size, block=block
+        )
+        batches = {partition: entries for partition, entries in response or []}
+        for partition in self.retry & set(streams):
+            if not batches.get(partition):
+                self.retry.discard(partition)
+        events = [(partition, entry_id, event) for partition, entries in batches.items() for entry_id, event in entries]
+        if not events:
+            return True
+        try:
+            async with AsyncSessionLocal() as db:
+                await apply_webhook_events(db, [(entry_id, event) for _, entry_id, event in events])
+        except Exception:
+            metrics.incr("webhooks.batch_failures")
+            return await self._apply_one_by_one(events)
+        await self._ack(events)
+        return True
+
+    async def _apply_one_by_one(self, events) -> bool:
+        # A stream key stops at its first failure so later events never overtake it
+        blocked: Set[str] = set()
+        done, ok = [], True
+        for partition, entry_id, event in events:
+            if event["stream_key"] in blocked:
+                continue
+            try:
+                async with AsyncSessionLocal() as db:
+                    await apply_webhook_events(db, [(entry_id, event)])
+                done.append((partition, entry_id, event))
+                continue
+            except TRANSIENT_ERRORS:
+                metrics.incr("webhooks.apply_failures")
+                ok = False
+                break
+            except Exception as e:
+                metrics.incr("webhooks.apply_failures")
+                error = repr(e)
+            attempts = await async_redis_client.hincrby(ATTEMPTS_KEY, entry_id, 1)
+            if attempts >= self.max_attempts:
+                await async_redis_client.xadd(
+                    DEAD_LETTER_KEY, {**event, "partition": partition, "entry_id": entry_id, "error": error[:1000]}
+                )
+                metrics.incr("webhooks.dead_lettered")
+                done.append((partition, entry_id, event))
+            else:
+                blocked.add(event["stream_key"])
+                ok = False
+        await self._ack(done)
+        self.retry.update(partition for partition in self.owned)
+        return ok
+
+    async def _ack(self, events):
+        if not events:
+            return
+        by_partition: Dict[str, List[str]] = {}
+        for partition, entry_id, _ in events:
+            by_partition.setdefault(partition, []).append(entry_id)
+        pipe = async_redis_client.pipeline(transaction=False)
+        for partition, entry_ids in by_partition.items():
+            pipe.xack(partition, GROUP, *entry_ids)
+            pipe.xdel(partition, *entry_ids)
+        pipe.hdel(ATTEMPTS_KEY, *[entry_id for _, entry_id, _ in events])
+        await pipe.execute()
+
+webhook_applier = WebhookApplier(
+    settings.WEBHOOK_QUEUE_PARTITIONS, settings.WEBHOOK_BATCH_SIZE, settings.WEBHOOK_BLOCK_MS,
+    settings.WEBHOOK_LEASE_MS, settings.WEBHOOK_MAX_ATTEMPTS,
+)
@@ -0,0 +1,60 @@
+from typing import Mapping, Optional
+from fastapi import HTTPException, Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import Stream
+from app.core.config import get_settings
+from app.core.redis import redis_client, async_redis_client
+from app.core import metrics
+import redis
+
+settings = get_settings()
+
+# stream_keys:<stream_key> -> stream id, shared by all workers. One string per
+# key so each expires on its own: an eviction that failed after a rotation or
+# delete stops authorizing publishes within WEBHOOK_STREAM_KEY_TTL_SECONDS.
+STREAM_KEY_CACHE_PREFIX = "stream_keys:"
+
+async def read_webhook_payload(request: Request) -> Mapping:
+    # nginx-rtmp posts form data; JSON is accepted for other callers
+    if request.headers.get("content-type", "").startswith("application/json"):
+        try:
+            data = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Malformed JSON body")
+        if not isinstance(data, dict):
+            raise HTTPException(status_code=400, detail="Expected a JSON object")
+        return data
+    return await request.form()
+
+async def resolve_stream_id(db: AsyncSession, stream_key: str) -> Optional[int]:
+    try:
+        cached = await async_redis_client.get(STREAM_KEY_CACHE_PREFIX + stream_key)
+    except redis.RedisError:
+        cached = None
+    if cached is not None:
+        metrics.incr("webhooks.stream_key_cache_hits")
+        return int(cached)
+    metrics.incr("webhooks.stream_key_cache_misses")
+    stream_id = (await db.execute(select(Stream.id).where(Stream.stream_key == stream_key))).scalar()
+    if stream_id is not None:
+        try:
+            await async_redis_client.set(STREAM_KEY_CACHE_PREFIX + stream_key, stream_id, ex=settings.WEBHOOK_STREAM_KEY_TTL_SECONDS)
+        except redis.RedisError:
+            pass
+    return stream_id
+
+# A failed eviction is harmless for correctness: webhook updates also match on
+# stream_key and evict entries that no longer resolve.
+
+def forget_stream_key(stream_key: str):
+    try:
+        redis_client.delete(STREAM_KEY_CACHE_PREFIX + stream_key)
+    except redis.RedisError:
+        metrics.incr("webhooks.stream_key_cache_errors")
+
+async def forget_stream_key_async(stream_key: str):
+    try:
+        await async_redis_client.delete(STREAM_KEY_CACHE_PREFIX + stream_key)
+    except redis.RedisError:
+        metrics.incr("webhooks.stream_key_cache_errors")
@@ -0,0 +1,87 @@
+"""Chat broadcast: CPU per message as the room grows.
+
+Drives the real ConnectionManager fan-out (per-connection queues drained
+by writer tasks) with stub sockets that discard what they are sent, so
+what is measured is encoding and fan-out on the event loop. Each message
+is encoded once and the same frame is queued for every viewer; with
+--per-recipient each viewer's copy is re-encoded from a dict instead, as
+send_json() did, for comparison. Batching is off so every viewer gets
+every frame. Run from backend/:
+
+    python -m benchmarks.chat_broadcast --sizes 10,100,1000,10000 --messages 200
+    python -m benchmarks.chat_broadcast --per-recipient
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+
+os.environ.setdefault("SECRET_KEY", "bench")
+for name in ("POSTGRES_SERVER", "POSTGRES_USER", "POSTGRES_PASSWORD", "POSTGRES_DB"):
+    os.environ.setdefault(name, "bench")
+
+from app.api.chat_ws import ChatConnection, ChatRoom, ConnectionManager
+from app.schemas.chat import ChatMessageRead
+
+STREAM_ID = 1
+
+class StubWebSocket:
+    def __init__(self):
+        self.sent = 0
+
+    async def send_text(self, frame: str):
+        self.sent += 1
+
+class PerRecipientSocket(StubWebSocket):
+    # What the old path cost per viewer: the payload dict encoded again for each send
+    async def send_text(self, frame: str):
+        json.dumps(json.loads(frame))
+        self.sent += 1
+
+def message(n: int) -> ChatMessageRead:
+    return ChatMessageRead(id=n, stream_id=STREAM_ID, user_id=n % 50, content=f"message {n} " + "x" * 60,
+                           timestamp=datetime.utcnow(), is_deleted=False)
+
+async def run_room(viewers: int, messages: int, per_recipient: bool):
+    manager = ConnectionManager()
+    manager.active_connections[STREAM_ID] = {}
+    manager.rooms[STREAM_ID] = ChatRoom()
+    sockets = []
+    for n in range(viewers):
+        websocket = PerRecipientSocket() if per_recipient else StubWebSocket()
+        connection = ChatConnection(websocket, n, batching=False)
+        connection.writer = asyncio.create_task(manager._write(STREAM_ID, connection))
+        manager.active_connections[STREAM_ID][websocket] = connection
+        sockets.append(websocket)
+    await asyncio.sleep(0)
+
+    wall, cpu = time.perf_counter(), time.process_time()
+    for n in range(messages):
+        manager.broadcast(STREAM_ID, message(n).model_dump_json())
+        # One pass of the loop lets every writer send the frame it was handed
+        await asyncio.sleep(0)
+    cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+
+    for connection in manager.active_connections[STREAM_ID].values():
+        connection.writer.cancel()
+    await asyncio.gather(*(c.writer for c in manager.active_connections[STREAM_ID].values()), return_exceptions=True)
+    delivered = sum(websocket.sent for websocket in sockets)
+    assert delivered == viewers * messages, f"{delivered} of {viewers * messages} frames delivered"
+    return cpu, wall
+
+async def bench(sizes, messages: int, per_recipient: bool):
+    print(f"mode  {'re-encoded per recipient' if per_recipient else 'encoded once, shared frame'}")
+    print(f"{'viewers':>8} {'cpu/msg':>11} {'cpu/frame':>11} {'msgs/s':>9}")
+    for viewers in sizes:
+        cpu, wall = await run_room(viewers, messages, per_recipient)
+        print(f"{viewers:>8} {cpu / messages * 1e6:>9.0f}us {cpu / (messages * viewers) * 1e9:>9.0f}ns {messages / wall:>9.0f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10,100,1000,10000")
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--per-recipient", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(bench([int(size) for size in args.sizes.split(",")], args.messages, args.per_recipient))
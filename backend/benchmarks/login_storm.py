@@ -0,0 +1,111 @@
+"""Login storm: many concurrent /auth/login calls against one worker.
+
+Runs the real auth router in-process (httpx ASGITransport) with an
+in-memory Redis and a stub user lookup, so what is measured is bcrypt
+scheduling and the event loop. A probe task sleeps 10 ms in a loop and
+records how late it wakes up; with bcrypt off the loop that lag stays
+near zero however many logins are queued. Run from backend/:
+
+    python -m benchmarks.login_storm --logins 200 --concurrency 50
+    python -m benchmarks.login_storm --inline   # bcrypt on the event loop, for comparison
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("SECRET_KEY", "bench")
+for name in ("POSTGRES_SERVER", "POSTGRES_USER", "POSTGRES_PASSWORD", "POSTGRES_DB"):
+    os.environ.setdefault(name, "bench")
+
+import fakeredis
+import httpx
+from fastapi import FastAPI
+from redis.commands.core import AsyncScript
+from app.api import auth as auth_api
+from app.models import UserRole
+from app.services.passwords import password_context, password_hasher
+
+PASSWORD = "Sup3r-secret!"
+
+class StubAsyncSession:
+    def __init__(self, user):
+        self.user = user
+
+    async def execute(self, statement):
+        return SimpleNamespace(scalar=lambda: self.user)
+
+    async def commit(self):
+        pass
+
+def use_fake_redis():
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    for name, module in list(sys.modules.items()):
+        if not name.startswith("app."):
+            continue
+        if getattr(module, "async_redis_client", None) is not None:
+            module.async_redis_client = client
+        for value in list(vars(module).values()):
+            if isinstance(value, AsyncScript):
+                value.registered_client = client
+
+async def probe_loop_lag(lags, stop: asyncio.Event):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.01)
+        lags.append(time.perf_counter() - started - 0.01)
+
+async def storm(logins: int, concurrency: int, inline: bool):
+    use_fake_redis()
+    # Each login gets its own address so the per-IP throttle does not kick in
+    user = SimpleNamespace(id=1, email="viewer@example.com", role=UserRole.viewer,
+                           hashed_password=password_context(password_hasher.rounds).hash(PASSWORD))
+    app = FastAPI()
+    app.include_router(auth_api.router)
+    app.dependency_overrides[auth_api.get_async_db] = lambda: StubAsyncSession(user)
+    if inline:
+        async def submit(fn, *args):
+            return fn(*args)
+        password_hasher._submit = submit
+    else:
+        password_hasher.start()
+        # Spawning the workers and importing bcrypt in them is not part of a login
+        await asyncio.gather(*(password_hasher.hash(PASSWORD) for _ in range(password_hasher.workers)))
+    lags, latencies, statuses = [], [], {}
+    stop = asyncio.Event()
+    probe = asyncio.create_task(probe_loop_lag(lags, stop))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def login(n: int):
+        transport = httpx.ASGITransport(app=app, client=(f"10.0.{n // 256}.{n % 256}", 1234))
+        async with semaphore, httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            started = time.perf_counter()
+            response = await client.post("/auth/login", json={"email": user.email, "password": PASSWORD})
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(login(n) for n in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe
+    password_hasher.stop()
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(f"mode           {'inline on the event loop' if inline else f'process pool x{password_hasher.workers}'}")
+    print(f"bcrypt rounds  {password_hasher.rounds}")
+    print(f"statuses       {dict(sorted(statuses.items()))}")
+    print(f"throughput     {logins / elapsed:.1f} logins/s")
+    print(f"latency        p50 {quantiles[49] * 1000:.0f} ms  p99 {quantiles[98] * 1000:.0f} ms")
+    print(f"loop lag       max {max(lags, default=0) * 1000:.1f} ms  over {len(lags)} probes")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--inline", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(storm(args.logins, args.concurrency, args.inline))
@@ -0,0 +1,90 @@
+"""Throughput of RecordingResponse against Starlette's FileResponse.
+
+Both responses are driven directly as ASGI apps, without the zerocopysend
+and pathsend extensions (uvicorn offers neither). send() copies each body
+into a bytes object, as a server's transport buffer would. Every case runs
+warm, with the file in the page cache, and cold, with the cache dropped
+(POSIX_FADV_DONTNEED) before each request so the reads go to disk. A probe
+task sleeps 1 ms in a loop and records how late it wakes up, which shows
+whether disk reads stall the event loop. Run from backend/:
+
+    python -m benchmarks.recording_throughput --size-mb 256 --requests 20
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ.setdefault("SECRET_KEY", "bench")
+for name in ("POSTGRES_SERVER", "POSTGRES_USER", "POSTGRES_PASSWORD", "POSTGRES_DB"):
+    os.environ.setdefault(name, "bench")
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from app.services.recordings import OpenRecording, RecordingResponse
+
+async def _receive():
+    return {"type": "http.disconnect"}
+
+async def drive(app, request_headers) -> int:
+    sent = 0
+    async def send(message):
+        nonlocal sent
+        if message["type"] == "http.response.body":
+            sent += len(bytes(message.get("body", b"")))
+    # ASGI 2.4: the response does not need to watch receive() for disconnects
+    scope = {
+        "type": "http", "asgi": {"spec_version": "2.4"}, "method": "GET", "path": "/",
+        "headers": request_headers.raw, "extensions": {},
+    }
+    await app(scope, _receive, send)
+    return sent
+
+async def probe_loop_lag(lags, stop: asyncio.Event):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append(time.perf_counter() - started - 0.001)
+
+async def measure(label: str, make_app, request_headers, requests: int, fd: int, cold: bool):
+    total, elapsed, lags = 0, 0.0, []
+    for _ in range(requests):
+        if cold:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        stop = asyncio.Event()
+        probe = asyncio.create_task(probe_loop_lag(lags, stop))
+        started = time.perf_counter()
+        total += await drive(make_app(), request_headers)
+        elapsed += time.perf_counter() - started
+        stop.set()
+        await probe
+    label = f"{label} ({'cold' if cold else 'warm'})"
+    print(f"{label:<46} {total / elapsed / 2**20:10.1f} MiB/s  {elapsed / requests * 1000:8.2f} ms/request"
+          f"  loop lag max {max(lags, default=0) * 1000:6.2f} ms")
+
+async def main(size_mb: int, requests: int):
+    with tempfile.NamedTemporaryFile(suffix=".flv") as file:
+        file.write(os.urandom(2**20) * size_mb)
+        file.flush()
+        # Dirty pages cannot be dropped, so the cold runs need the data on disk first
+        os.fsync(file.fileno())
+        recording = OpenRecording(file.name)
+        size = recording.size
+        cases = [
+            ("full", Headers({})),
+            ("range (last quarter)", Headers({"range": f"bytes={size * 3 // 4}-"})),
+        ]
+        for cold in (False, True):
+            for name, headers in cases:
+                await measure(f"RecordingResponse {name}", lambda: RecordingResponse(recording, headers, "GET"),
+                              headers, requests, file.fileno(), cold)
+                await measure(f"FileResponse {name}", lambda: FileResponse(file.name, headers=None),
+                              headers, requests, file.fileno(), cold)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=128)
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.size_mb, args.requests))
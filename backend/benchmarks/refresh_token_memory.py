@@ -0,0 +1,103 @@
+"""Refresh tokens: Redis memory per token, standalone keys vs per-user families.
+
+Fills --families users with --tokens sessions each, first in the layout
+create_refresh_token used to write (one refresh_token:<secret> string per
+token holding the email, with a TTL), then in the current one (one
+refresh_family:<email> hash per user, written by create_refresh_token
+itself). For each it reports the growth of INFO memory used_memory and the
+sum of MEMORY USAGE over the keys written. Families are capped at
+REFRESH_TOKEN_MAX_SESSIONS tokens, so more tokens than that are not all
+kept. Needs a real Redis, since fakeredis implements neither command; the
+keys are deleted again afterwards, but point it at a scratch database. Run
+from backend/:
+
+    python -m benchmarks.refresh_token_memory --redis-url redis://localhost:6379/15 --families 10000 --tokens 5
+"""
+import argparse
+import asyncio
+import os
+import secrets
+
+os.environ.setdefault("SECRET_KEY", "bench")
+for name in ("POSTGRES_SERVER", "POSTGRES_USER", "POSTGRES_PASSWORD", "POSTGRES_DB"):
+    os.environ.setdefault(name, "bench")
+
+import redis.asyncio as redis
+from app.services import auth
+
+BATCH = 1000
+
+def batches(items):
+    for start in range(0, len(items), BATCH):
+        yield items[start:start + BATCH]
+
+async def used_memory(client) -> int:
+    return (await client.info("memory"))["used_memory"]
+
+async def memory_usage(client, keys) -> int:
+    total = 0
+    for batch in batches(keys):
+        pipe = client.pipeline(transaction=False)
+        for key in batch:
+            pipe.memory_usage(key, samples=0)
+        total += sum(usage or 0 for usage in await pipe.execute())
+    return total
+
+async def delete(client, keys):
+    for batch in batches(keys):
+        await client.delete(*batch)
+
+async def fill_standalone(client, emails, tokens: int):
+    # What create_refresh_token wrote before token families
+    ttl = auth.REFRESH_TOKEN_EXPIRE_DAYS * 24 * 3600
+    keys = []
+    for _ in range(tokens):
+        for batch in batches(emails):
+            pipe = client.pipeline(transaction=False)
+            for email in batch:
+                key = f"refresh_token:{secrets.token_urlsafe(32)}"
+                pipe.set(key, email, ex=ttl)
+                keys.append(key)
+            await pipe.execute()
+    return keys, len(keys)
+
+async def fill_families(client, emails, tokens: int):
+    for _ in range(tokens):
+        for batch in batches(emails):
+            await asyncio.gather(*(auth.create_refresh_token(email) for email in batch))
+    keys = [auth.refresh_family_key(email) for email in emails]
+    stored = 0
+    for batch in batches(keys):
+        pipe = client.pipeline(transaction=False)
+        for key in batch:
+            pipe.hlen(key)
+        stored += sum(await pipe.execute())
+    return keys, stored
+
+async def measure(label: str, client, fill, emails, tokens: int):
+    before = await used_memory(client)
+    keys, stored = await fill(client, emails, tokens)
+    grown = await used_memory(client) - before
+    usage = await memory_usage(client, keys)
+    await delete(client, keys)
+    print(f"{label:<18} {len(keys):>9} {stored:>9} {grown / 2**20:>10.2f} MiB {usage / 2**20:>10.2f} MiB"
+          f" {usage / stored:>8.0f} B {usage / len(emails):>8.0f} B")
+
+async def main(redis_url: str, families: int, tokens: int):
+    client = redis.from_url(redis_url, decode_responses=True)
+    auth._add_refresh_token.registered_client = client
+    emails = [f"bench-{n}@refresh-memory.invalid" for n in range(families)]
+    await delete(client, [auth.refresh_family_key(email) for email in emails])
+    print(f"{families} users x {tokens} tokens, at most {auth.settings.REFRESH_TOKEN_MAX_SESSIONS} kept per family")
+    print(f"{'layout':<18} {'keys':>9} {'tokens':>9} {'used_memory':>14} {'MEMORY USAGE':>14} {'per token':>10} {'per user':>10}")
+    await measure("standalone keys", client, fill_standalone, emails, tokens)
+    await measure("token families", client, fill_families, emails, tokens)
+    await client.aclose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--redis-url", default=auth.settings.REDIS_URL)
+    parser.add_argument("--families", type=int, default=10000)
+    parser.add_argument("--tokens", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.redis_url, args.families, args.tokens))
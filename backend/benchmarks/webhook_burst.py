@@ -0,0 +1,137 @@
+"""Webhook burst: on_publish/on_publish_done latency under a flood of events.
+
+Runs the real stream router in-process (httpx ASGITransport) with an
+in-memory Redis and a stub database that sleeps --db-ms per statement, and
+fires a burst of /streams/webhook/stream-start and /stream-stop posts at
+once, as nginx-rtmp does when an ingest server restarts. With the queue on,
+a request only resolves the key and appends to the partition stream while
+the WebhookApplier running alongside writes the events in batches; the
+report gives request latency and how long the applier took to drain the
+burst. With --inline every request writes its own update, as the handlers
+did before the queue. Run from backend/:
+
+    python -m benchmarks.webhook_burst --events 2000 --streams 500 --db-ms 2
+    python -m benchmarks.webhook_burst --inline   # apply in the request, for comparison
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("SECRET_KEY", "bench")
+for name in ("POSTGRES_SERVER", "POSTGRES_USER", "POSTGRES_PASSWORD", "POSTGRES_DB"):
+    os.environ.setdefault(name, "bench")
+
+import fakeredis
+import httpx
+from fastapi import FastAPI
+from redis.commands.core import AsyncScript
+from app.api import stream as stream_api
+from app.core import metrics
+from app.services import webhook_queue
+from app.services.webhook_queue import webhook_applier
+
+class StubAsyncSession:
+    """Answers stream key lookups and status updates as if every key "key-<n>" were stream n."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.statements = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def execute(self, statement, parameters=None):
+        self.statements += 1
+        await asyncio.sleep(self.delay)
+        params = statement.compile().params
+        if "stream_key_1" in params:
+            stream_id = int(params["stream_key_1"].rsplit("-", 1)[1])
+            return SimpleNamespace(scalar=lambda: stream_id)
+        matched = [stream_id for value in params.values() if isinstance(value, list) for stream_id, _ in value]
+        return SimpleNamespace(scalars=lambda: matched)
+
+    async def commit(self):
+        await asyncio.sleep(self.delay)
+
+def use_fake_redis():
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    for name, module in list(sys.modules.items()):
+        if not name.startswith("app."):
+            continue
+        if getattr(module, "async_redis_client", None) is not None:
+            module.async_redis_client = client
+        for value in list(vars(module).values()):
+            if isinstance(value, AsyncScript):
+                value.registered_client = client
+    # The applier registers its lease scripts when it is built
+    webhook_applier._lease.registered_client = client
+    webhook_applier._release.registered_client = client
+
+async def burst(events: int, streams: int, db_ms: float, inline: bool):
+    use_fake_redis()
+    delay = db_ms / 1000
+    sessions = []
+
+    def session():
+        sessions.append(StubAsyncSession(delay))
+        return sessions[-1]
+
+    app = FastAPI()
+    app.include_router(stream_api.router)
+    app.dependency_overrides[stream_api.get_async_db] = session
+    webhook_queue.AsyncSessionLocal = session
+    if inline:
+        async def refuse(event):
+            return False
+        stream_api.enqueue_webhook = refuse
+    else:
+        webhook_applier.start()
+        # Taking the partition leases is not part of the burst
+        while len(webhook_applier.owned) < len(webhook_applier.partitions):
+            await asyncio.sleep(0.01)
+    applied_before = metrics.snapshot().get("webhooks.applied", 0)
+
+    latencies, statuses = [], {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def post(n: int):
+            # Each stream is started, then stopped, then started again...
+            path = "stream-start" if (n // streams) % 2 == 0 else "stream-stop"
+            started = time.perf_counter()
+            # nginx-rtmp posts a form; JSON takes the same path without needing python-multipart here
+            response = await client.post(f"/streams/webhook/{path}", json={"name": f"key-{n % streams}"})
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(post(n) for n in range(events)))
+        answered = time.perf_counter() - started
+        while metrics.snapshot().get("webhooks.applied", 0) - applied_before < events:
+            await asyncio.sleep(0.005)
+        drained = time.perf_counter() - started
+    if not inline:
+        await webhook_applier.stop()
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(f"mode        {'inline in the request' if inline else f'queued, {len(webhook_applier.partitions)} partitions'}")
+    print(f"burst       {events} events over {streams} streams, {db_ms:g} ms per statement")
+    print(f"statuses    {dict(sorted(statuses.items()))}")
+    print(f"latency     p50 {quantiles[49] * 1000:.1f} ms  p99 {quantiles[98] * 1000:.1f} ms  max {max(latencies) * 1000:.1f} ms")
+    print(f"answered    {answered * 1000:.0f} ms  ({events / answered:.0f} req/s)")
+    print(f"applied     {drained * 1000:.0f} ms  in {sum(s.statements for s in sessions)} statements")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--streams", type=int, default=500)
+    parser.add_argument("--db-ms", type=float, default=2.0)
+    parser.add_argument("--inline", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(burst(args.events, args.streams, args.db_ms, args.inline))
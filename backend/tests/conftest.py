@@ -0,0 +1,54 @@
+import fakeredis
+import os
+import pytest
+import sys
+import threading
+from redis.commands.core import AsyncScript, Script
+
+# Settings are read once at import time; the required ones get placeholders so
+# the app imports without a .env. Tests needing a real server skip without one.
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("POSTGRES_SERVER", "localhost")
+os.environ.setdefault("POSTGRES_USER", "postgres")
+os.environ.setdefault("POSTGRES_PASSWORD", "postgres")
+os.environ.setdefault("POSTGRES_DB", "vls_test")
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """Points every imported app module's Redis clients at one in-process fake server."""
+    server = fakeredis.FakeServer()
+    sync_client = fakeredis.FakeRedis(server=server, decode_responses=True)
+    async_client = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+    for name, module in list(sys.modules.items()):
+        if not name.startswith("app."):
+            continue
+        if getattr(module, "redis_client", None) is not None:
+            monkeypatch.setattr(module, "redis_client", sync_client)
+        if getattr(module, "async_redis_client", None) is not None:
+            monkeypatch.setattr(module, "async_redis_client", async_client)
+        # Lua scripts registered at import time are bound to the real client
+        for value in list(vars(module).values()):
+            if isinstance(value, AsyncScript):
+                monkeypatch.setattr(value, "registered_client", async_client)
+            elif isinstance(value, Script):
+                monkeypatch.setattr(value, "registered_client", sync_client)
+    return async_client
+
+@pytest.fixture
+def redis_url():
+    """A Redis other processes can reach: TEST_REDIS_URL if set, else fakeredis over TCP."""
+    if os.environ.get("TEST_REDIS_URL"):
+        yield os.environ["TEST_REDIS_URL"]
+        return
+    server = fakeredis.TcpFakeServer(("127.0.0.1", 0))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address
+    yield f"redis://{host}:{port}/0"
+    server.shutdown()
+    server.server_close()
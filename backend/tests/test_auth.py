@@ -0,0 +1,44 @@
+from types import SimpleNamespace
+import fakeredis
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api import auth as auth_api
+from app.models import UserRole
+from app.services import auth
+from app.services.passwords import password_context, password_hasher
+
+PASSWORD = "Sup3r-secret!"
+
+class StubAsyncSession:
+    def __init__(self, user):
+        self.user = user
+
+    async def execute(self, statement):
+        return SimpleNamespace(scalar=lambda: self.user)
+
+    async def commit(self):
+        pass
+
+@pytest.fixture
+def client(fake_redis, monkeypatch):
+    monkeypatch.setattr(password_hasher, "rounds", 4)
+    user = SimpleNamespace(id=1, email="viewer@example.com", role=UserRole.viewer, hashed_password=password_context(4).hash(PASSWORD))
+    app = FastAPI()
+    app.include_router(auth_api.router)
+    app.dependency_overrides[auth_api.get_async_db] = lambda: StubAsyncSession(user)
+    return TestClient(app)
+
+def no_blocking_redis(self, *args, **options):
+    raise AssertionError(f"blocking Redis call {args[0]} from an async handler")
+
+def test_login_issues_refresh_token_without_blocking_redis(client, monkeypatch):
+    with monkeypatch.context() as patch:
+        patch.setattr(fakeredis.FakeRedis, "execute_command", no_blocking_redis)
+        response = client.post("/auth/login", json={"email": "viewer@example.com", "password": PASSWORD})
+    assert response.status_code == 200, response.text
+    assert auth.verify_refresh_token(response.json()["refresh_token"]) == "viewer@example.com"
+
+def test_wrong_password_is_rejected(client):
+    response = client.post("/auth/login", json={"email": "viewer@example.com", "password": "Wrong-pass1!"})
+    assert response.status_code == 401
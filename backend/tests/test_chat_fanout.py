@@ -0,0 +1,116 @@
+"""Chat fan-out across worker processes sharing one Redis.
+
+Each worker process runs its own ConnectionManager and pub/sub hub with
+viewers on two streams, and every worker publishes a numbered sequence on
+both. Every viewer must receive every message exactly once, each worker's
+messages in the order it sent them, and all viewers of a stream must agree
+on the order; each process must have used a single pub/sub connection.
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import queue
+import pytest
+
+WORKERS = 3
+VIEWERS_PER_STREAM = 4
+MESSAGES = 50
+STREAMS = (1, 2)
+
+class RecordingWebSocket:
+    def __init__(self):
+        self.frames = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, frame):
+        self.frames.append(frame)
+
+    async def close(self, code=1000):
+        pass
+
+def run_worker(redis_url, index, ready, go, results):
+    os.environ.update(
+        REDIS_URL=redis_url, SECRET_KEY="test-secret", POSTGRES_SERVER="localhost",
+        POSTGRES_USER="postgres", POSTGRES_PASSWORD="postgres", POSTGRES_DB="vls_test",
+    )
+    results.put(asyncio.run(worker(index, ready, go)))
+
+async def worker(index, ready, go):
+    from app.core import pubsub
+    from app.api.chat_ws import ConnectionManager
+
+    connections = 0
+    open_pubsub = pubsub.async_redis_client.pubsub
+    def counting_pubsub(**kwargs):
+        nonlocal connections
+        connections += 1
+        return open_pubsub(**kwargs)
+    pubsub.async_redis_client.pubsub = counting_pubsub
+
+    pubsub.pubsub_hub.start()
+    manager = ConnectionManager()
+    sockets = {stream_id: [RecordingWebSocket() for _ in range(VIEWERS_PER_STREAM)] for stream_id in STREAMS}
+    for stream_id, viewers in sockets.items():
+        for user_id, websocket in enumerate(viewers):
+            await manager.connect(stream_id, websocket, user_id, batching=False)
+    await pubsub.pubsub_hub.connected.wait()
+    # A probe coming back proves the subscriptions are live before anyone publishes
+    for stream_id in STREAMS:
+        await manager.publish(stream_id, json.dumps({"probe": index}))
+    await until(lambda: all(viewer.frames for viewers in sockets.values() for viewer in viewers))
+    ready.put(index)
+    await asyncio.get_running_loop().run_in_executor(None, go.wait)
+
+    for n in range(MESSAGES):
+        for stream_id in STREAMS:
+            await manager.publish(stream_id, json.dumps({"worker": index, "n": n}))
+    expected = WORKERS * MESSAGES
+    await until(lambda: all(len(messages(viewer)) >= expected for viewers in sockets.values() for viewer in viewers))
+    # Anything extra would be a duplicate; give it a moment to show up
+    await asyncio.sleep(0.2)
+    await pubsub.pubsub_hub.stop()
+    return index, connections, {stream_id: [messages(viewer) for viewer in viewers] for stream_id, viewers in sockets.items()}
+
+def messages(websocket):
+    frames = [json.loads(frame) for frame in websocket.frames]
+    return [(frame["worker"], frame["n"]) for frame in frames if "probe" not in frame]
+
+async def until(condition, timeout=30.0):
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("timed out")
+
+def test_every_viewer_gets_every_message_once_in_order(redis_url):
+    context = multiprocessing.get_context("spawn")
+    ready, results, go = context.Queue(), context.Queue(), context.Event()
+    processes = [context.Process(target=run_worker, args=(redis_url, n, ready, go, results)) for n in range(WORKERS)]
+    for process in processes:
+        process.start()
+    try:
+        for _ in processes:
+            ready.get(timeout=60)
+        go.set()
+        outcomes = [results.get(timeout=60) for _ in processes]
+    except queue.Empty:
+        pytest.fail("a worker process did not finish")
+    finally:
+        for process in processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+
+    expected = {(worker, n) for worker in range(WORKERS) for n in range(MESSAGES)}
+    for stream_id in STREAMS:
+        sequences = [sequence for _, _, streams in outcomes for sequence in streams[stream_id]]
+        assert len(sequences) == WORKERS * VIEWERS_PER_STREAM
+        for sequence in sequences:
+            assert len(sequence) == len(expected) and set(sequence) == expected
+            for worker in range(WORKERS):
+                assert [n for w, n in sequence if w == worker] == list(range(MESSAGES))
+        assert all(sequence == sequences[0] for sequence in sequences)
+    assert [connections for _, connections, _ in outcomes] == [1] * WORKERS
@@ -0,0 +1,123 @@
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+import asyncio
+import json
+import pytest
+import threading
+import time
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api import chat_ws
+from app.core.pubsub import pubsub_hub
+from app.services import chat
+from app.services.chat import ChatIdsUnavailable, ChatMessageIdAllocator
+
+class StubResult:
+    def first(self):
+        return SimpleNamespace(chat_user_rate=None, chat_stream_rate=None)
+
+    def scalars(self):
+        return SimpleNamespace(first=lambda: None)
+
+class StubAsyncSession:
+    """Answers the stream and moderation lookups; delay makes every query slow."""
+
+    def __init__(self, delay=0.0, querying=None):
+        self.delay = delay
+        self.querying = querying
+
+    async def execute(self, statement):
+        if self.querying:
+            self.querying.set()
+        await asyncio.sleep(self.delay)
+        return StubResult()
+
+    async def close(self):
+        pass
+
+class FailingAllocator(ChatMessageIdAllocator):
+    def __init__(self, failures):
+        super().__init__(block_size=3)
+        self.failures = failures
+        self.reserved = 0
+
+    async def _reserve(self):
+        self.reserved += 1
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionRefusedError("database is down")
+        return [1, 2, 3]
+
+@pytest.fixture
+def chat_client(fake_redis, monkeypatch):
+    """The chat router in-process, with fake Redis, stub session and ids, and submit() into a list.
+    Sessions for the stream ids in slow_streams take that many seconds per query."""
+    written = []
+    monkeypatch.setattr(chat_ws.chat_writer, "submit", lambda row: written.append(row) or True)
+    monkeypatch.setattr(chat_ws, "chat_ids", FailingAllocator(failures=0))
+    slow_streams = {}
+    querying = threading.Event()
+
+    @asynccontextmanager
+    async def lifespan(app):
+        pubsub_hub.start()
+        # A message published before the listener subscribes would never arrive
+        await pubsub_hub.connected.wait()
+        yield
+        await pubsub_hub.stop()
+
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(chat_ws.router)
+    def get_async_db(stream_id: int):
+        if stream_id in slow_streams:
+            return StubAsyncSession(slow_streams[stream_id], querying)
+        return StubAsyncSession()
+
+    app.dependency_overrides[chat_ws.get_async_db] = get_async_db
+    app.dependency_overrides[chat_ws.get_current_user_async] = lambda: SimpleNamespace(id=7)
+    with TestClient(app) as client:
+        yield client, written, slow_streams, querying
+
+@pytest.mark.anyio
+async def test_allocator_backs_off_while_the_database_is_down():
+    allocator = FailingAllocator(failures=1)
+    with pytest.raises(ChatIdsUnavailable):
+        await allocator.next_id()
+    # Within the backoff no query is attempted
+    with pytest.raises(ChatIdsUnavailable):
+        await allocator.next_id()
+    assert allocator.reserved == 1
+    allocator._retry_at = 0
+    assert [await allocator.next_id() for _ in range(3)] == [1, 2, 3]
+
+def test_socket_survives_an_id_outage(chat_client, monkeypatch):
+    client, written, _, _ = chat_client
+    # No backoff, so the message after the failed one tries the database again
+    monkeypatch.setattr(chat, "ID_RETRY_SECONDS", 0)
+    monkeypatch.setattr(chat_ws, "chat_ids", FailingAllocator(failures=1))
+    with client.websocket_connect("/ws/streams/1/chat?batch=off") as websocket:
+        websocket.send_text("lost")
+        websocket.send_text("delivered")
+        message = json.loads(websocket.receive_text())
+    assert message["content"] == "delivered"
+    assert [row["content"] for row in written] == ["delivered"]
+
+def test_slow_query_does_not_stall_other_sockets(chat_client):
+    client, written, slow_streams, querying = chat_client
+    slow_streams[2] = 3.0
+
+    def join_slow_stream():
+        with client.websocket_connect("/ws/streams/2/chat"):
+            pass
+
+    slow = threading.Thread(target=join_slow_stream)
+    slow.start()
+    assert querying.wait(5)
+    started = time.monotonic()
+    with client.websocket_connect("/ws/streams/1/chat?batch=off") as websocket:
+        websocket.send_text("hello")
+        message = json.loads(websocket.receive_text())
+    # A query blocking the loop would hold this exchange until it finished
+    assert time.monotonic() - started < 1.5
+    assert message["content"] == "hello"
+    slow.join()
@@ -0,0 +1,36 @@
+import pytest
+from app import main
+
+SERVICES = ["pubsub_hub", "chat_writer", "presence_tracker", "audit_log", "password_hasher", "vod_processor", "webhook_applier"]
+
+class StubService:
+    def __init__(self, name, stopped, fail=False):
+        self.name, self.stopped, self.fail = name, stopped, fail
+
+    def start(self):
+        pass
+
+    def stop(self):
+        self.stopped.append(self.name)
+        if self.fail:
+            raise RuntimeError(f"{self.name} failed to stop")
+
+class AsyncStubService(StubService):
+    async def stop(self):
+        super().stop()
+
+@pytest.mark.anyio
+async def test_every_service_stops_when_one_fails(monkeypatch):
+    stopped = []
+    for name in SERVICES:
+        cls = StubService if name in ("audit_log", "password_hasher") else AsyncStubService
+        monkeypatch.setattr(main, name, cls(name, stopped, fail=name == "presence_tracker"))
+
+    async def subscribe_invalidations():
+        pass
+
+    monkeypatch.setattr(main, "subscribe_invalidations", subscribe_invalidations)
+    with pytest.raises(RuntimeError):
+        async with main.lifespan(main.app):
+            pass
+    assert stopped == SERVICES[::-1]
@@ -0,0 +1,13 @@
+import redis
+from app.core import metrics
+from app.services import moderation
+
+class BrokenRedis:
+    def publish(self, channel, message):
+        raise redis.ConnectionError("down")
+
+def test_publish_survives_redis_errors(monkeypatch):
+    monkeypatch.setattr(moderation, "redis_client", BrokenRedis())
+    before = metrics.snapshot().get("moderation.publish_errors", 0)
+    moderation.publish_moderation_update(1, 2, True, False)
+    assert metrics.snapshot()["moderation.publish_errors"] == before + 1
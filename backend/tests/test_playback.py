@@ -0,0 +1,49 @@
+from urllib.parse import urlsplit
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api.playback import router
+from app.services.playback import signed_hls_url, signed_url, verify_hls_path
+
+def hls_path(stream_key, ttl=None):
+    return urlsplit(signed_hls_url("http://edge", "/hls", stream_key, ttl)["playback_url"]).path
+
+def sibling(path, name):
+    return path.rsplit("/", 1)[0] + "/" + name
+
+def test_playlist_and_its_segments_verify():
+    path = hls_path("abc")
+    assert path.endswith("/abc.m3u8")
+    assert verify_hls_path(path)
+    assert verify_hls_path(sibling(path, "abc-0.ts"))
+    assert verify_hls_path(sibling(path, "abc-1234.ts"))
+
+@pytest.mark.parametrize("name", ["abcd.m3u8", "abc-1.m3u8", "abc-1-0.ts", "ab-0.ts", "abc.ts", "abc-x.ts", "other.m3u8"])
+def test_token_does_not_cover_other_streams(name):
+    assert not verify_hls_path(sibling(hls_path("abc"), name))
+
+def test_keys_with_dashes_keep_their_own_segments():
+    path = hls_path("abc-1")
+    assert verify_hls_path(sibling(path, "abc-1-7.ts"))
+    assert not verify_hls_path(sibling(path, "abc-7.ts"))
+
+def test_expired_and_tampered_tokens_fail():
+    assert not verify_hls_path(hls_path("abc", ttl=-10))
+    prefix, expires, signature, name = hls_path("abc").rsplit("/", 3)
+    assert not verify_hls_path(f"{prefix}/{int(expires) + 60}/{signature}/{name}")
+    assert not verify_hls_path(f"/live/{expires}/{signature}/{name}")
+    assert not verify_hls_path("/abc.m3u8")
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(router)
+    return TestClient(app)
+
+def test_verify_endpoint_accepts_both_token_forms(client):
+    segment = sibling(hls_path("abc"), "abc-3.ts")
+    assert client.get("/playback/verify", headers={"X-Original-URI": segment}).status_code == 204
+    recording = urlsplit(signed_url("", "/recordings/a.flv")["playback_url"])
+    uri = f"{recording.path}?{recording.query}"
+    assert client.get("/playback/verify", headers={"X-Original-URI": uri}).status_code == 204
+    assert client.get("/playback/verify", headers={"X-Original-URI": "/recordings/a.flv"}).status_code == 403
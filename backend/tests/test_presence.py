@@ -0,0 +1,75 @@
+import asyncio
+import pytest
+import redis
+import time
+from app.core import metrics
+from app.services import presence
+from app.services.presence import PresenceTracker
+
+class BrokenPipeline:
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    async def execute(self):
+        raise redis.ConnectionError("Redis is down")
+
+class BrokenRedis:
+    def pipeline(self, transaction=True):
+        return BrokenPipeline()
+
+class StubWebSocket:
+    async def accept(self):
+        pass
+
+    async def send_text(self, frame):
+        pass
+
+    async def close(self, code=1000):
+        pass
+
+@pytest.fixture
+def broken_presence(fake_redis, monkeypatch):
+    monkeypatch.setattr(presence, "async_redis_client", BrokenRedis())
+
+@pytest.mark.anyio
+async def test_tracker_survives_redis_errors(broken_presence):
+    tracker = PresenceTracker()
+    errors = metrics.snapshot().get("presence.write_errors", 0)
+    await tracker.connect(1, 10)
+    await tracker.chatted(1, 10)
+    assert tracker.local == {1: 1}
+    # Not remembered as counted, so the next message tries again
+    assert tracker.chatters[1] == set()
+    await tracker.disconnect(1)
+    assert tracker.local == {}
+    assert metrics.snapshot()["presence.write_errors"] == errors + 3
+
+@pytest.mark.anyio
+async def test_socket_is_registered_and_released_when_presence_fails(broken_presence):
+    from app.api.chat_ws import ConnectionManager
+    manager = ConnectionManager()
+    websocket = StubWebSocket()
+    await manager.connect(1, websocket, 10)
+    assert websocket in manager.active_connections[1]
+    manager.disconnect(1, websocket)
+    await asyncio.gather(*manager.background)
+    assert manager.active_connections == {}
+
+@pytest.mark.anyio
+async def test_stop_survives_redis_errors(broken_presence):
+    tracker = PresenceTracker()
+    tracker.local[1] = 2
+    errors = metrics.snapshot().get("presence.write_errors", 0)
+    await tracker.stop()
+    assert metrics.snapshot()["presence.write_errors"] == errors + 1
+
+@pytest.mark.anyio
+async def test_heartbeat_prunes_dead_workers(fake_redis):
+    now = time.time()
+    await fake_redis.zadd(presence.WORKERS_KEY, {"live": now, "dead": now - 3600})
+    await fake_redis.hset(presence.sockets_key(1), mapping={"live": 2, "dead": 5, "gone": 1})
+    tracker = PresenceTracker()
+    tracker.local[1] = 3
+    await tracker.beat()
+    assert await fake_redis.hgetall(presence.sockets_key(1)) == {"live": "2", presence.WORKER_ID: "3"}
+    assert 0 < await fake_redis.ttl(presence.sockets_key(1)) <= presence.settings.PRESENCE_WORKER_TTL_SECONDS
@@ -0,0 +1,114 @@
+from urllib.parse import urlsplit
+import asyncio
+import pytest
+import redis.asyncio
+from app.core import pubsub
+from app.core.pubsub import PubSubHub
+
+class DroppingProxy:
+    """Forwards TCP to Redis and can cut every open connection, as a network blip would."""
+
+    def __init__(self, upstream: str):
+        url = urlsplit(upstream)
+        self.upstream = (url.hostname, url.port)
+        self.writers = set()
+
+    async def start(self) -> str:
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        host, port = self.server.sockets[0].getsockname()
+        return f"redis://{host}:{port}/0"
+
+    async def _handle(self, reader, writer):
+        upstream_reader, upstream_writer = await asyncio.open_connection(*self.upstream)
+        self.writers.update((writer, upstream_writer))
+        await asyncio.gather(self._pipe(reader, upstream_writer), self._pipe(upstream_reader, writer))
+
+    async def _pipe(self, reader, writer):
+        try:
+            while data := await reader.read(65536):
+                writer.write(data)
+                await writer.drain()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            writer.close()
+
+    def drop(self):
+        for writer in self.writers:
+            writer.transport.abort()
+        self.writers.clear()
+
+    def close(self):
+        self.drop()
+        self.server.close()
+
+async def eventually(condition, timeout=5.0):
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition not met in time")
+
+@pytest.fixture
+async def hub(redis_url, monkeypatch):
+    proxy = DroppingProxy(redis_url)
+    monkeypatch.setattr(pubsub, "async_redis_client", redis.asyncio.Redis.from_url(await proxy.start(), decode_responses=True))
+    hub = PubSubHub(retry_seconds=0.05, max_retry_seconds=0.2)
+    hub.start()
+    publisher = redis.asyncio.Redis.from_url(redis_url, decode_responses=True)
+    yield hub, proxy, publisher
+    await hub.stop()
+    proxy.close()
+    await publisher.aclose()
+
+@pytest.mark.anyio
+async def test_reconnects_and_resubscribes(hub):
+    hub, proxy, publisher = hub
+    received, reconnects = [], []
+    await hub.subscribe("chat:stream:1", received.append, on_reconnect=lambda: reconnects.append(1))
+    await asyncio.wait_for(hub.connected.wait(), 5)
+    await publisher.publish("chat:stream:1", "before")
+    await eventually(lambda: received == ["before"])
+
+    proxy.drop()
+    await eventually(lambda: reconnects == [1])
+    await publisher.publish("chat:stream:1", "after")
+    await eventually(lambda: received == ["before", "after"])
+
+@pytest.mark.anyio
+async def test_resubscribing_right_after_unsubscribing_stays_subscribed(hub):
+    hub, proxy, publisher = hub
+    received = []
+    await asyncio.wait_for(hub.connected.wait(), 5)
+    await hub.subscribe("chat:stream:1", received.append)
+    hub.unsubscribe("chat:stream:1")
+    await hub.subscribe("chat:stream:1", received.append)
+    await asyncio.sleep(0.1)
+    await publisher.publish("chat:stream:1", "kept")
+    await eventually(lambda: received == ["kept"])
+
+    hub.unsubscribe("chat:stream:1")
+    await asyncio.sleep(0.1)
+    assert await publisher.publish("chat:stream:1", "dropped") == 0
+
+@pytest.mark.anyio
+async def test_principal_invalidations_reach_other_workers(hub, monkeypatch):
+    from app.models import User
+    from app.services import principals
+    hub, proxy, publisher = hub
+    cache = principals.PrincipalCache(maxsize=10, ttl=60)
+    monkeypatch.setattr(principals, "principal_cache", cache)
+    monkeypatch.setattr(principals, "pubsub_hub", hub)
+    monkeypatch.setattr(principals, "async_redis_client", publisher)
+    await principals.subscribe_invalidations()
+    await asyncio.wait_for(hub.connected.wait(), 5)
+    cache.put("token-a", User(id=1, email="a@example.com"))
+    cache.put("token-b", User(id=2, email="b@example.com"))
+
+    # Published by "another worker": only the subscription can have removed it here
+    await publisher.publish(principals.INVALIDATIONS_CHANNEL, "a@example.com")
+    await eventually(lambda: cache.get("token-a") is None)
+    assert cache.get("token-b") is not None
+
+    proxy.drop()
+    await eventually(lambda: len(cache) == 0)
@@ -0,0 +1,160 @@
+"""EXPLAIN regression suite for the list and lookup endpoints.
+
+Each endpoint is called in-process against a seeded Postgres and every
+SELECT it runs is put through EXPLAIN; the test fails if any plan reads one
+of the large tables with a sequential scan. Needs TEST_DATABASE_URL (a
+psycopg2 URL); everything is created in a throwaway schema that is dropped
+afterwards. The schema comes from the models, whose indexes mirror the
+migrations.
+"""
+from datetime import datetime
+from types import SimpleNamespace
+import os
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from app.api import stream, vod
+from app.core.pagination import encode_cursor
+from app.dependencies import get_db
+from app.models import UserRole
+from app.models.user import Base
+from app.services.auth import get_current_user
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+SCHEMA = "query_plans"
+LARGE_TABLES = {"streams", "vods", "chat_messages"}
+
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set")
+
+# Sized so that a sequential scan costs clearly more than any index path
+SEED = [
+    """
+    INSERT INTO users (email, hashed_password, is_active, is_superuser, role)
+    SELECT 'user' || n || '@example.com', 'x', true, false, 'streamer'
+    FROM generate_series(1, 2000) n
+    """,
+    # Most streams have ended, a few are live or scheduled; one in ten is private
+    """
+    INSERT INTO streams (title, status, stream_key, owner_id, is_public, created_at, updated_at)
+    SELECT 'stream ' || n,
+           (CASE WHEN n % 50 = 0 THEN 'live' WHEN n % 50 = 1 THEN 'scheduled' ELSE 'ended' END)::streamstatus,
+           md5(n::text), 1 + n % 2000, n % 10 <> 0,
+           timestamp '2026-01-01' + n * interval '1 minute', timestamp '2026-01-01' + n * interval '1 minute'
+    FROM generate_series(1, 100000) n
+    """,
+    """
+    INSERT INTO vods (stream_id, file_path, created_at, is_public)
+    SELECT 1 + n % 100000, 'live/' || n || '.flv', timestamp '2026-01-01' + n * interval '30 seconds', n % 10 <> 0
+    FROM generate_series(1, 200000) n
+    """,
+    """
+    INSERT INTO chat_messages (stream_id, user_id, content, timestamp, is_deleted)
+    SELECT 1 + n % 1000, 1 + n % 2000, 'message ' || n, timestamp '2026-01-01' + n * interval '1 second', n % 100 = 0
+    FROM generate_series(1, 500000) n
+    """,
+]
+
+@pytest.fixture(scope="module")
+def engine():
+    admin = create_engine(TEST_DATABASE_URL)
+    try:
+        with admin.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+            conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+    except OperationalError as e:
+        admin.dispose()
+        pytest.skip(f"TEST_DATABASE_URL is unreachable: {e}")
+    engine = create_engine(TEST_DATABASE_URL, connect_args={"options": f"-c search_path={SCHEMA}"})
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for statement in SEED:
+            conn.execute(text(statement))
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("ANALYZE"))
+    yield engine
+    engine.dispose()
+    with admin.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+    admin.dispose()
+
+@pytest.fixture
+def client(engine, fake_redis, monkeypatch):
+    """The stream and VOD routers on the seeded schema as an admin, with the cache on fake Redis."""
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    def get_test_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    # Chat history opens its own session while streaming
+    monkeypatch.setattr(stream, "SessionLocal", Session)
+    app = FastAPI()
+    app.include_router(stream.router)
+    app.include_router(vod.router)
+    app.dependency_overrides[get_db] = get_test_db
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(id=1, role=UserRole.admin)
+    return TestClient(app)
+
+@pytest.fixture
+def selects(engine):
+    """Every SELECT sent to the database while the test runs, with its parameters."""
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            captured.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    yield captured
+    event.remove(engine, "before_cursor_execute", capture)
+
+def sequential_scans(plan: dict):
+    if plan["Node Type"] == "Seq Scan" and plan["Relation Name"] in LARGE_TABLES:
+        yield plan["Relation Name"]
+    for child in plan.get("Plans", []):
+        yield from sequential_scans(child)
+
+def cursor_at(created_at: str, id: int) -> str:
+    return encode_cursor(datetime.fromisoformat(created_at), id)
+
+ENDPOINTS = [
+    ("GET", "/streams/", None),
+    ("GET", "/streams/?status=live", None),
+    ("GET", "/streams/?status=live&is_public=true", None),
+    ("GET", "/streams/?is_public=true", None),
+    ("GET", "/streams/?is_public=false", None),
+    ("GET", "/streams/?owner_id=7", None),
+    ("GET", "/streams/?owner_id=7&is_public=true", None),
+    ("GET", f"/streams/?cursor={cursor_at('2026-02-01 00:00:00', 44640)}", None),
+    ("GET", f"/streams/?status=ended&is_public=true&cursor={cursor_at('2026-02-01 00:00:00', 44640)}", None),
+    ("GET", "/streams/1234", None),
+    ("POST", "/streams/batch-get", {"ids": [1, 500, 99999]}),
+    ("GET", "/streams/1234/playback-url", None),
+    ("POST", "/streams/playback-urls", {"ids": [1, 500, 99999]}),
+    ("GET", "/streams/1/chat", None),
+    ("GET", f"/streams/1/chat?before={cursor_at('2026-01-03 00:00:00', 172000)}", None),
+    ("GET", f"/streams/1/chat?after={cursor_at('2026-01-03 00:00:00', 172000)}", None),
+    ("GET", "/vods/", None),
+    ("GET", "/vods/?is_public=true", None),
+    ("GET", "/vods/?is_public=false", None),
+    ("GET", "/vods/?owner_id=7", None),
+    ("GET", f"/vods/?is_public=true&cursor={cursor_at('2026-01-20 00:00:00', 54720)}", None),
+    ("GET", "/vods/1234/playback-url", None),
+    ("POST", "/vods/playback-urls", {"ids": [1, 500, 199999]}),
+]
+
+@pytest.mark.parametrize("method,url,body", ENDPOINTS, ids=[f"{method} {url}" for method, url, _ in ENDPOINTS])
+def test_endpoint_queries_use_indexes(client, engine, selects, method, url, body):
+    response = client.request(method, url, json=body)
+    assert response.status_code < 500, response.text
+    assert selects, f"{url} ran no queries"
+    with engine.connect() as conn:
+        for statement, parameters in list(selects):
+            plan = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()[0]["Plan"]
+            assert not list(sequential_scans(plan)), f"{url} runs a sequential scan:\n{statement}"
@@ -0,0 +1,108 @@
+import os
+import pytest
+from app.services import recordings
+from app.services.recordings import (
+    RecordingNotFound, RecordingStorageUnavailable, relative_recording_path, resolve_recording,
+)
+
+@pytest.fixture
+def root(tmp_path, monkeypatch):
+    storage = tmp_path / "recordings"
+    storage.mkdir()
+    (storage / "key-1.flv").write_bytes(b"FLV")
+    (tmp_path / "secret").write_bytes(b"secret")
+    monkeypatch.setattr(recordings.settings, "VOD_STORAGE_ROOT", str(storage))
+    return storage
+
+def test_unset_root_refuses_everything(monkeypatch):
+    monkeypatch.setattr(recordings.settings, "VOD_STORAGE_ROOT", None)
+    with pytest.raises(RecordingStorageUnavailable):
+        resolve_recording("key-1.flv")
+
+def test_relative_and_absolute_paths_under_root(root):
+    assert resolve_recording("key-1.flv") == str(root / "key-1.flv")
+    assert relative_recording_path(str(root / "key-1.flv")) == "key-1.flv"
+
+def test_legacy_rows_with_stripped_absolute_paths_resolve(root):
+    legacy = str(root / "key-1.flv").lstrip("/")
+    assert resolve_recording(legacy) == str(root / "key-1.flv")
+    assert relative_recording_path(legacy) == "key-1.flv"
+
+@pytest.mark.parametrize("file_path", ["../secret", "/etc/passwd", "a/../../secret", "", "."])
+def test_paths_outside_root_are_rejected(root, file_path):
+    with pytest.raises(RecordingNotFound):
+        resolve_recording(file_path)
+
+def test_symlink_out_of_root_is_rejected(root):
+    os.symlink(root.parent / "secret", root / "link.flv")
+    with pytest.raises(RecordingNotFound):
+        resolve_recording("link.flv")
+
+@pytest.mark.parametrize("header, size, expected", [
+    (None, 100, None),
+    ("bytes=0-", 100, (0, 99)),
+    ("bytes=10-19", 100, (10, 19)),
+    ("bytes=90-500", 100, (90, 99)),
+    ("bytes=-10", 100, (90, 99)),
+    ("bytes=-500", 100, (0, 99)),
+    ("bytes=0-1,5-6", 100, None),
+    ("bytes=a-b", 100, None),
+    ("bytes=-", 100, None),
+    # Last before first is invalid syntax, so the header is ignored rather than refused
+    ("bytes=20-10", 100, None),
+])
+def test_parse_range(header, size, expected):
+    assert recordings.parse_range(header, size) == expected
+
+@pytest.mark.parametrize("header, size", [
+    ("bytes=-0", 100),
+    ("bytes=100-", 100),
+    ("bytes=-10", 0),
+    ("bytes=0-", 0),
+])
+def test_unsatisfiable_ranges(header, size):
+    with pytest.raises(ValueError):
+        recordings.parse_range(header, size)
+
+@pytest.fixture
+def client(root):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from app.api.recordings import router
+    app = FastAPI()
+    app.include_router(router)
+    return TestClient(app)
+
+def signed(path):
+    from app.services.playback import signed_url
+    return signed_url("", path)["playback_url"]
+
+def test_serves_ranges_and_rejects_unsatisfiable(client):
+    url = signed("/recordings/key-1.flv")
+    assert client.get(url).content == b"FLV"
+    response = client.get(url, headers={"Range": "bytes=1-"})
+    assert response.status_code == 206
+    assert response.content == b"LV"
+    assert response.headers["content-range"] == "bytes 1-2/3"
+    response = client.get(url, headers={"Range": "bytes=-0"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == "bytes */3"
+    response = client.get(url, headers={"Range": "bytes=2-1"})
+    assert response.status_code == 200
+    assert response.content == b"FLV"
+
+def test_streams_body_in_chunks(client, monkeypatch):
+    monkeypatch.setattr(recordings, "CHUNK_SIZE", 2)
+    url = signed("/recordings/key-1.flv")
+    assert client.get(url).content == b"FLV"
+    response = client.get(url, headers={"Range": "bytes=1-2"})
+    assert response.status_code == 206
+    assert response.content == b"LV"
+
+def test_refuses_to_serve_without_root(client, monkeypatch):
+    monkeypatch.setattr(recordings.settings, "VOD_STORAGE_ROOT", None)
+    assert client.get(signed("/recordings/key-1.flv")).status_code == 503
+
+def test_rejects_unsigned_and_escaping_paths(client):
+    assert client.get("/recordings/key-1.flv").status_code == 403
+    assert client.get(signed("/recordings/..%2Fsecret")).status_code == 404
@@ -0,0 +1,18 @@
+import pytest
+from app.services.response_cache import etag_matches
+
+ETAG = '"abc123"'
+
+@pytest.mark.parametrize("header, expected", [
+    ('"abc123"', True),
+    ('W/"abc123"', True),
+    ('"zzz", W/"abc123"', True),
+    ("*", True),
+    ("", False),
+    ('"abc"', False),
+    ('"abc1234"', False),
+    ('"xabc123"x', False),
+    ('abc123', False),
+])
+def test_if_none_match_compares_whole_tokens(header, expected):
+    assert etag_matches(header, ETAG) is expected
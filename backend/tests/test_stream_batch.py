@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api import stream
+from app.models import UserRole
+
+class StubQuery:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def filter(self, *criteria):
+        return self
+
+    def all(self):
+        return self.rows
+
+class StubSession:
+    def __init__(self, rows):
+        self.rows = rows
+        self.executed = []
+
+    def query(self, *columns):
+        return StubQuery(self.rows)
+
+    def execute(self, statement):
+        self.executed.append(statement)
+
+    def commit(self):
+        pass
+
+@pytest.fixture
+def client(monkeypatch):
+    db = StubSession([SimpleNamespace(id=1, owner_id=10), SimpleNamespace(id=2, owner_id=99)])
+    monkeypatch.setattr(stream.response_cache, "invalidate", lambda *namespaces: None)
+    app = FastAPI()
+    app.include_router(stream.router)
+    app.dependency_overrides[stream.get_db] = lambda: db
+    app.dependency_overrides[stream.get_current_user] = lambda: SimpleNamespace(id=10, role=UserRole.viewer)
+    return TestClient(app), db
+
+def test_results_follow_input_order(client):
+    client, db = client
+    response = client.post("/streams/batch-status", json={"updates": [
+        {"id": 3, "status": "live"}, {"id": 2, "status": "live"}, {"id": 1, "status": "ended"},
+    ]})
+    assert response.status_code == 200
+    assert [(r["id"], r["status_code"]) for r in response.json()["results"]] == [(3, 404), (2, 403), (1, 200)]
+    assert len(db.executed) == 1
+
+def test_duplicate_ids_are_rejected(client):
+    client, db = client
+    response = client.post("/streams/batch-status", json={"updates": [
+        {"id": 1, "status": "live"}, {"id": 2, "status": "live"}, {"id": 1, "status": "ended"},
+    ]})
+    assert response.status_code == 422
+    assert response.json()["detail"] == "Duplicate stream ids: [1]"
+    assert db.executed == []
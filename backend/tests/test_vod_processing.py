@@ -0,0 +1,110 @@
+from types import SimpleNamespace
+import asyncio
+import pytest
+from app.services import vod_processing
+from app.services.media import MediaError, probe
+from app.services.vod_processing import UNPROCESSABLE_FORMAT, JobLocked, VODProcessor, job_lock_key
+
+class StubSession:
+    """Answers the processor's row lookup and records the values it updates."""
+
+    def __init__(self, row, updates):
+        self.row = row
+        self.updates = updates
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement):
+        if statement.is_select:
+            return SimpleNamespace(first=lambda: self.row)
+        self.updates.append(statement.compile().params)
+
+    async def commit(self):
+        pass
+
+@pytest.fixture
+def processor(tmp_path, monkeypatch, fake_redis):
+    (tmp_path / "junk.flv").write_bytes(b"not a recording")
+    monkeypatch.setattr(vod_processing.settings, "VOD_STORAGE_ROOT", str(tmp_path))
+    updates = []
+    def sessions(file_path):
+        row = SimpleNamespace(file_path=file_path, format=None)
+        monkeypatch.setattr(vod_processing, "AsyncSessionLocal", lambda: StubSession(row, updates))
+        return updates
+    # No pool: probe runs on the loop's default executor
+    return VODProcessor(pool_size=1, concurrency=1, max_attempts=3, retry_delay=0), sessions
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("file_path", ["junk.flv", "../outside.flv"])
+async def test_unprocessable_files_are_marked_terminal(processor, file_path):
+    processor, sessions = processor
+    updates = sessions(file_path)
+    assert await processor._process(1) is True
+    assert updates == [{"format": UNPROCESSABLE_FORMAT, "id_1": 1}]
+
+@pytest.mark.anyio
+async def test_giving_up_marks_terminal(processor, monkeypatch):
+    processor, sessions = processor
+    updates = sessions("missing.flv")
+    processor.queue = asyncio.Queue()
+    processor.submit([7])
+    worker = asyncio.create_task(processor._work())
+    try:
+        for _ in range(200):
+            if not processor.queued:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        worker.cancel()
+    # A missing file may yet appear, so it is retried before being given up on
+    assert updates == [{"format": UNPROCESSABLE_FORMAT, "id_1": 7}]
+
+async def wait_until_idle(processor):
+    for _ in range(200):
+        if not processor.queued:
+            return
+        await asyncio.sleep(0.01)
+
+@pytest.mark.anyio
+async def test_job_locked_elsewhere_is_checked_again(processor, fake_redis):
+    processor, sessions = processor
+    updates = sessions("junk.flv")
+    await fake_redis.set(job_lock_key(7), "other-worker")
+    with pytest.raises(JobLocked):
+        await processor._process(7)
+    processor.queue = asyncio.Queue()
+    processor.submit([7])
+    worker = asyncio.create_task(processor._work())
+    try:
+        await asyncio.sleep(0.05)
+        # Still ours to finish should the holder fail, and no attempts spent meanwhile
+        assert 7 in processor.queued and updates == []
+        await fake_redis.delete(job_lock_key(7))
+        await wait_until_idle(processor)
+    finally:
+        worker.cancel()
+    assert updates == [{"format": UNPROCESSABLE_FORMAT, "id_1": 7}]
+
+@pytest.mark.anyio
+async def test_stop_cancels_pending_retries(processor):
+    processor, _ = processor
+    processor.start()
+    processor._retry_later(7, 2, 0.01)
+    handle = processor._retries[7]
+    await processor.stop()
+    assert handle.cancelled() and not processor._retries
+    await asyncio.sleep(0.02)
+
+@pytest.mark.parametrize("data", [
+    b"FLV\x01\x05",
+    b"\x00\x00\x00\x14moov\x00\x00\x00\x0cmvhd\x00\x00\x00\x00",
+    b"\x00\x00\x00\x10moov\x00\x00\x00\x08mvhd",
+])
+def test_truncated_headers_are_media_errors(tmp_path, data):
+    (tmp_path / "cut").write_bytes(data)
+    with pytest.raises(MediaError):
+        probe(str(tmp_path / "cut"))
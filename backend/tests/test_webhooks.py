@@ -0,0 +1,46 @@
+from types import SimpleNamespace
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api import stream
+from app.services import webhooks
+
+@pytest.fixture
+def client(fake_redis):
+    app = FastAPI()
+    app.include_router(stream.router)
+    app.dependency_overrides[stream.get_async_db] = lambda: None
+    return TestClient(app)
+
+@pytest.mark.parametrize("body", [b'{"name": "key-1"', b"\xff", b'["key-1"]'])
+def test_malformed_json_is_a_bad_request(client, body):
+    response = client.post("/streams/webhook/stream-start", content=body,
+                           headers={"content-type": "application/json"})
+    assert response.status_code == 400
+
+class StubAsyncSession:
+    def __init__(self, stream_id):
+        self.stream_id = stream_id
+        self.queries = 0
+
+    async def execute(self, statement):
+        self.queries += 1
+        return SimpleNamespace(scalar=lambda: self.stream_id)
+
+@pytest.mark.anyio
+async def test_cached_stream_keys_expire(fake_redis):
+    db = StubAsyncSession(7)
+    assert await webhooks.resolve_stream_id(db, "key-7") == 7
+    assert await webhooks.resolve_stream_id(db, "key-7") == 7
+    assert db.queries == 1
+    ttl = await fake_redis.ttl(webhooks.STREAM_KEY_CACHE_PREFIX + "key-7")
+    assert 0 < ttl <= webhooks.settings.WEBHOOK_STREAM_KEY_TTL_SECONDS
+
+@pytest.mark.anyio
+async def test_forgotten_stream_key_goes_back_to_the_database(fake_redis):
+    db = StubAsyncSession(7)
+    await webhooks.resolve_stream_id(db, "key-7")
+    await webhooks.forget_stream_key_async("key-7")
+    db.stream_id = None
+    assert await webhooks.resolve_stream_id(db, "key-7") is None
+    assert db.queries == 2